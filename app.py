@@ -1,14 +1,26 @@
 import base64
 import os
 import zipfile
-import mimetypes
 import re
+import threading
+import time
+import unicodedata
+import uuid
 import numpy as np
 import dash
+from collections import OrderedDict
+from concurrent.futures import wait, FIRST_COMPLETED
 from io import BytesIO, StringIO
-from dash import Dash, dcc, html, Input, Output, State, dash_table
+from urllib.parse import quote
+from dash import Dash, dcc, html, Input, Output, State, dash_table, ctx, Patch
 from dash.dependencies import ALL
 from dash.exceptions import PreventUpdate
+from flask import Response, abort, stream_with_context
+from lobster_core import (
+    LOBSTER_FILES, broaden_matrix, broadened_pair_curves, clear_stale_dos_files, discard_compound, dos_curves,
+    find_compounds, get_dynamic_xrange, load_columns, orbital_channel_curves, parse_compound,
+    rank_pair_interactions, remove_files, rigid_band_integrals, spin_columns, spool_to_disk, submit_job,
+)
 import plotly.graph_objects as go
 import plotly.io as pio
 
@@ -24,9 +36,27 @@ DEFAULTS = {
     "ymax": 2,
     "legend_y": 0.26,
     "legend_x": 0.95,
+    "show_titles": ['plot_title', 'x_title', 'y_title'],
+    "show_axis_scale": ['x_scale', 'y_scale'],
 }
 
 DEMO_FILE = "CeCoAl4.zip"
+DEMO_DATASET_ID = "demo"
+# Server-side root of LOBSTER run folders; enables the local run browser when set
+DATA_ROOT = os.environ.get("LOBSTER_DATA_ROOT")
+
+PAIR_COLORS = ['blue', 'red', 'green', 'gray', 'black', 'orange', 'purple', 'pink', 'silver']
+PAIR_COLOR_CYCLE = ['red', 'green', 'blue', 'orange']
+ORBITAL_COLORS = ['purple', 'teal', 'brown', 'magenta', 'olive', 'navy']
+TOGGLE_OPTIONS = [{"label": "✓", "value": "yes"}, {"label": "–", "value": "no"}]
+BOND_TABLE_PAGE_SIZE = 15
+THUMBNAIL_POINTS = 150
+DRILLDOWN_TOP_N = 10
+FERMI_TABLE_INTERACTIONS = 50
+SPIN_LABELS = {"up": "spin ↑", "down": "spin ↓"}
+EXPORT_CHUNK_ROWS = 2000
+# Traces x points above which the plots switch from SVG to WebGL (Scattergl)
+WEBGL_POINT_BUDGET = int(os.environ.get("WEBGL_POINT_BUDGET", 20000))
 
 app = Dash(__name__)
 
@@ -34,6 +64,259 @@ def subscript_numbers(text):
     sub_map = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
     return re.sub(r'(\d+)', lambda m: m.group(0).translate(sub_map), text)
 
+# --- Bond table filtering (DataTable filter_query syntax) ---
+FILTER_OPERATORS = [
+    ['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'],
+    ['ne ', '!='], ['eq ', '='], ['contains '],
+]
+NUMERIC_FILTERS = {
+    'ge': np.greater_equal, 'le': np.less_equal, 'lt': np.less,
+    'gt': np.greater, 'ne': np.not_equal, 'eq': np.equal, 'contains': np.equal,
+}
+
+def split_filter_part(filter_part):
+    # One "{column} op value" clause of a DataTable filter_query
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value = value_part.strip()
+                if value and value[0] == value[-1] and value[0] in ("'", '"', '`'):
+                    value = value[1:-1]
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+def bond_table_mask(columns, filter_query):
+    mask = np.ones(len(columns["bond"]), dtype=bool)
+    for filter_part in (filter_query or "").split(' && '):
+        name, operator, value = split_filter_part(filter_part)
+        if name not in columns:
+            continue
+        col = columns[name]
+        if col.dtype.kind == 'U':
+            if operator == 'contains':
+                mask &= np.char.find(col, value) >= 0
+            elif operator in ('eq', 'ne'):
+                mask &= (col == value) if operator == 'eq' else (col != value)
+            continue
+        try:
+            mask &= NUMERIC_FILTERS[operator](col, float(value))
+        except ValueError:
+            continue
+    return mask
+
+def bond_table_page(bonds, page_current, page_size, sort_by, filter_query):
+    # Filter through a boolean mask over a pre-sorted index and slice out one page
+    columns = bonds["columns"]
+    if sort_by and sort_by[0]["column_id"] in bonds["sorted"]:
+        order = bonds["sorted"][sort_by[0]["column_id"]]
+        if sort_by[0]["direction"] == "desc":
+            order = order[::-1]
+    else:
+        order = bonds["sorted"]["bond"]
+    order = order[bond_table_mask(columns, filter_query)[order]]
+    page = order[page_current * page_size:(page_current + 1) * page_size]
+    page_columns = {
+        name: [None if isinstance(v, float) and np.isnan(v) else v for v in col[page].tolist()]
+        for name, col in columns.items()
+    }
+    records = [dict(zip(page_columns, row)) for row in zip(*page_columns.values())]
+    page_count = max(1, -(-len(order) // page_size))
+    return records, page_count
+
+# --- Data export helpers ---
+def iter_csv_chunks(header, columns, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Yield the CSV a block of rows at a time so the full text never exists at once;
+    # %.17g round-trips every float64 exactly
+    yield (",".join(header) + "\n").encode()
+    for start in range(0, len(columns[0]), chunk_rows):
+        block = np.column_stack([col[start:start + chunk_rows] for col in columns])
+        buffer = StringIO()
+        np.savetxt(buffer, block, delimiter=",", fmt="%.17g")
+        yield buffer.getvalue().encode()
+
+def selected_curves(compound, pairs, sigma=0, shape='gaussian', spin="total"):
+    # Plotted (sign-adjusted, broadened) curves of the selected pairs, keyed by column name
+    curves = {}
+    energy = None
+    for kind, p_name, i_name in (("cohp", "-pCOHP", "-ICOHP"), ("coop", "pCOOP", "ICOOP")):
+        parsed = compound[kind]
+        if not parsed:
+            continue
+        if energy is None:
+            energy = parsed["energy"]
+        elif parsed["energy"].shape != energy.shape:
+            continue
+        p_mat, i_mat = broadened_pair_curves(compound, kind, sigma, shape, spin)
+        for i, pair in enumerate(compound["unique_pairs"]):
+            if pair not in pairs:
+                continue
+            pair_str = f"{pair[0]}-{pair[1]}"
+            curves[f"{pair_str} {p_name}"] = p_mat[i]
+            curves[f"{pair_str} {i_name}"] = i_mat[i]
+    return energy, curves
+
+def iter_interaction_dump(parsed):
+    # Raw per-interaction columns of one COHPCAR/COOPCAR, straight from the cache
+    header = ["Energy (eV)"]
+    columns = [parsed["energy"]]
+    spin_names = [""] if parsed["spins"] == 1 else [" up", " down"]
+    for label, col in zip(parsed["labels"], parsed["interaction_columns"]):
+        for s, spin_name in enumerate(spin_names):
+            header += [f"{label} p{spin_name}", f"{label} I{spin_name}"]
+            columns += list(load_columns(parsed, [col + s * parsed["spin_stride"], col + 1 + s * parsed["spin_stride"]]).T)
+    return iter_csv_chunks(header, columns)
+
+# --- Server-side dataset cache ---
+DATASET_CACHE_SIZE = 64
+DATASETS = OrderedDict()
+# Parsed once at startup and never evicted (the demo)
+PINNED_DATASETS = {}
+# kind -> (plot callback inputs, figure) of the demo's default plots
+DEMO_FIGURES = {}
+# job id -> {"pending": {future: folder name}, "polled": last poll time}
+GALLERY_JOBS = {}
+# Jobs nobody polled for this long (tab closed mid-parse) are cancelled and dropped
+GALLERY_JOB_TTL = 60
+_cache_lock = threading.Lock()
+def store_dataset(compound):
+    dataset_id = uuid.uuid4().hex
+    with _cache_lock:
+        DATASETS[dataset_id] = compound
+        while len(DATASETS) > DATASET_CACHE_SIZE:
+            discard_compound(DATASETS.popitem(last=False)[1])
+    return dataset_id
+
+def drop_dataset(dataset_id):
+    # Evict one dataset early (its source files changed), removing its DOS file
+    with _cache_lock:
+        compound = DATASETS.pop(dataset_id, None)
+    discard_compound(compound)
+
+def get_dataset(data):
+    if not data or "dataset_id" not in data:
+        return None
+    if data["dataset_id"] in PINNED_DATASETS:
+        return PINNED_DATASETS[data["dataset_id"]]
+    with _cache_lock:
+        compound = DATASETS.get(data["dataset_id"])
+        if compound is not None:
+            DATASETS.move_to_end(data["dataset_id"])
+    return compound
+
+def dataset_summary(dataset_id, compound):
+    return {
+        "dataset_id": dataset_id,
+        "has_cohp": compound["cohp"] is not None,
+        "has_coop": compound["coop"] is not None,
+        "has_dos": compound.get("dos") is not None,
+        "spin_polarized": any(compound[kind] and compound[kind]["spins"] > 1 for kind in ("cohp", "coop")),
+        "unique_pairs": compound["unique_pairs"],
+        "folder_name": compound["folder_name"],
+    }
+
+# --- Local run-directory index ---
+RUN_INDEX = {}
+# directory -> (directory mtime, matched LOBSTER file paths) from the last scan
+RUN_DIR_ENTRIES = {}
+# Minimum seconds between the background scans page loads may start
+RUN_SCAN_INTERVAL = 30
+_index_lock = threading.Lock()
+_scan_lock = threading.Lock()
+_last_scan = 0.0
+
+def match_run_files(dirpath, filenames):
+    # LOBSTER_FILES key -> path of the first matching entry
+    paths = {}
+    for name in sorted(filenames):
+        for key, tag in LOBSTER_FILES:
+            if tag in name and key not in paths:
+                paths[key] = os.path.join(dirpath, name)
+    return paths
+
+def stat_run_files(paths):
+    files = {}
+    for key, path in paths.items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Removed or unreadable mid-scan
+            continue
+        files[key] = (path, stat.st_mtime_ns, stat.st_size)
+    return files
+
+def scan_run_directory(root, force=False):
+    # Walk root, re-matching entries against LOBSTER_FILES only in directories whose
+    # mtime changed (entries added, removed or renamed) or on force. The matched
+    # files are re-stated on every scan, since a re-run rewrites them in place
+    # without touching the directory. Folders whose (mtime, size) changed lose
+    # their cached dataset.
+    global _last_scan
+    with _scan_lock:
+        found = {}
+        seen = set()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            try:
+                dir_mtime = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(dirpath)
+            cached = RUN_DIR_ENTRIES.get(dirpath)
+            if cached and cached[0] == dir_mtime and not force:
+                paths = cached[1]
+            else:
+                paths = match_run_files(dirpath, filenames)
+                RUN_DIR_ENTRIES[dirpath] = (dir_mtime, paths)
+            files = stat_run_files(paths)
+            if "cohp" in files or "coop" in files:
+                found[os.path.relpath(dirpath, root)] = files
+        for dirpath in list(RUN_DIR_ENTRIES):
+            if dirpath not in seen:
+                del RUN_DIR_ENTRIES[dirpath]
+        _last_scan = time.monotonic()
+        return update_run_index(found)
+
+def update_run_index(found):
+    # Replaced or vanished folders drop the dataset parsed from their old files
+    stale = []
+    with _index_lock:
+        for folder in list(RUN_INDEX):
+            if folder not in found:
+                stale.append(RUN_INDEX.pop(folder)["dataset_id"])
+        for folder, files in found.items():
+            entry = RUN_INDEX.get(folder)
+            if entry is None or entry["files"] != files:
+                if entry is not None:
+                    stale.append(entry["dataset_id"])
+                RUN_INDEX[folder] = {"files": files, "dataset_id": None}
+        folders = sorted(RUN_INDEX)
+    for dataset_id in stale:
+        if dataset_id:
+            drop_dataset(dataset_id)
+    return folders
+
+def start_background_scan(root):
+    # Refresh the index off the request thread, at most every RUN_SCAN_INTERVAL seconds
+    if _scan_lock.locked() or time.monotonic() - _last_scan < RUN_SCAN_INTERVAL:
+        return
+    threading.Thread(target=scan_run_directory, args=(root,), daemon=True).start()
+
+def open_run_folder(folder):
+    # Serve an indexed folder from the dataset cache, parsing from disk only when needed
+    with _index_lock:
+        entry = RUN_INDEX.get(folder)
+    if entry is None:
+        return None, None
+    compound = get_dataset({"dataset_id": entry["dataset_id"]}) if entry["dataset_id"] else None
+    if compound is None:
+        files = {key: path for key, (path, _, _) in entry["files"].items()}
+        name = os.path.basename(os.path.normpath(os.path.join(DATA_ROOT, folder)))
+        compound = parse_compound(name, files)
+        entry["dataset_id"] = store_dataset(compound)
+    return entry["dataset_id"], compound
+
 app.layout = html.Div([
     html.H1("COHP & COOP Plotter", style={
         "fontSize": "32px", "fontWeight": "bold", "fontFamily": "DejaVu Sans, Arial, sans-serif",
@@ -79,7 +362,106 @@ app.layout = html.Div([
         }),
     ], style={"marginTop": "15px"}),
 
+    html.Div([
+        dcc.RadioItems(
+            id='export-format',
+            options=[
+                {'label': 'CSV', 'value': 'csv'},
+                {'label': 'NumPy .npz', 'value': 'npz'},
+            ],
+            value='csv',
+            inline=True,
+            style={"fontFamily": "DejaVu Sans, Arial, sans-serif", "marginRight": "10px"}
+        ),
+        html.Button("Export curves", id="export-curves", n_clicks=0, style={
+            "backgroundColor": "#007BFF", "color": "white", "padding": "10px 20px",
+            "border": "none", "borderRadius": "5px", "cursor": "pointer",
+            "fontSize": "16px", "fontWeight": "bold", "fontFamily": "DejaVu Sans, Arial, sans-serif",
+            "marginRight": "10px", "boxShadow": "0px 4px 6px rgba(0, 0, 0, 0.1)"
+        }),
+        html.A("COHP per-interaction dump", id='export-cohp-dump', href='', style={
+            "display": "none", "marginRight": "10px", "fontFamily": "DejaVu Sans, Arial, sans-serif"
+        }),
+        html.A("COOP per-interaction dump", id='export-coop-dump', href='', style={
+            "display": "none", "fontFamily": "DejaVu Sans, Arial, sans-serif"
+        }),
+    ], style={"marginTop": "15px", "display": "flex", "alignItems": "center"}),
+
+    html.Div([
+        html.Label("Broadening σ (eV):", style={"fontWeight": "bold", "marginRight": "10px"}),
+        html.Div(
+            dcc.Slider(
+                id='broadening-sigma', min=0, max=1, step=0.01, value=0, updatemode='drag',
+                marks={m: m for m in ['0', '0.25', '0.5', '0.75', '1']},
+            ),
+            style={"width": "300px"}
+        ),
+        dcc.RadioItems(
+            id='broadening-shape',
+            options=[
+                {'label': 'Gaussian', 'value': 'gaussian'},
+                {'label': 'Lorentzian', 'value': 'lorentzian'},
+            ],
+            value='gaussian',
+            inline=True,
+            style={"marginLeft": "10px"}
+        ),
+        dcc.RadioItems(
+            id='spin-view',
+            options=[
+                {'label': 'Total', 'value': 'total'},
+                {'label': 'Spin ↑', 'value': 'up'},
+                {'label': 'Spin ↓', 'value': 'down'},
+            ],
+            value='total',
+            inline=True,
+            style={"marginLeft": "30px", "display": "none"}
+        ),
+    ], style={
+        "marginTop": "15px", "display": "flex", "alignItems": "center",
+        "fontFamily": "DejaVu Sans, Arial, sans-serif"
+    }),
+
+    html.Div([
+        html.Label("Run folder:", style={"fontWeight": "bold", "marginRight": "10px"}),
+        dcc.Dropdown(id='run-folder', options=[], placeholder=f"Calculations under {DATA_ROOT}",
+                     style={"width": "400px", "marginRight": "10px"}),
+        html.Button("Rescan", id="rescan-runs", n_clicks=0, style={
+            "backgroundColor": "#6c757d", "color": "white", "padding": "10px 20px",
+            "border": "none", "borderRadius": "5px", "cursor": "pointer",
+            "fontSize": "16px", "fontWeight": "bold", "fontFamily": "DejaVu Sans, Arial, sans-serif",
+            "boxShadow": "0px 4px 6px rgba(0, 0, 0, 0.1)"
+        }),
+    ], style={
+        "marginTop": "15px", "alignItems": "center", "fontFamily": "DejaVu Sans, Arial, sans-serif",
+        "display": "flex" if DATA_ROOT else "none"
+    }),
+
+    html.Div([
+        html.Label("Orbital breakdown:", style={"fontWeight": "bold", "marginRight": "10px"}),
+        dcc.Dropdown(id='orbital-channels', options=[], value=[], multi=True,
+                     placeholder="Orbital channels, e.g. Al p – Co d", style={"width": "500px"}),
+    ], id='orbital-controls', style={
+        "marginTop": "15px", "alignItems": "center", "fontFamily": "DejaVu Sans, Arial, sans-serif",
+        "display": "none"
+    }),
+
+    html.Div(id='compound-gallery', style={
+        "display": "flex", "flexWrap": "wrap", "gap": "10px", "marginTop": "15px"
+    }),
+
     html.Div([
+        html.Div([
+            dcc.Dropdown(id='dos-projections', options=[], value=[], multi=True,
+                         placeholder="DOS projections, e.g. Co d", style={"width": "400px", "marginBottom": "8px"}),
+            dcc.Graph(id='dos-plot', style={
+                "height": "725px",
+                "width": "400px",
+                "backgroundColor": "#fff",
+                "borderRadius": "10px",
+                "boxShadow": "0px 4px 6px rgba(0, 0, 0, 0.08)"
+            }),
+        ], id='dos-panel', style={"display": "none", "flexDirection": "column", "marginRight": "20px"}),
         html.Div([
             html.Div(id='cohp-warning'),
             dcc.Graph(id='cohp-plot', style={
@@ -156,7 +538,7 @@ app.layout = html.Div([
                         {'label': 'X axis title', 'value': 'x_title'},
                         {'label': 'Y axis title', 'value': 'y_title'},
                     ],
-                    value=['plot_title', 'x_title', 'y_title'],
+                    value=DEFAULTS["show_titles"],
                     inline=True,
                     style={"fontFamily": "DejaVu Sans, Arial, sans-serif", "marginLeft": "10px"}
                 ),
@@ -169,7 +551,7 @@ app.layout = html.Div([
                         {'label': 'Show X axis scale', 'value': 'x_scale'},
                         {'label': 'Show Y axis scale', 'value': 'y_scale'},
                     ],
-                    value=['x_scale', 'y_scale'],
+                    value=DEFAULTS["show_axis_scale"],
                     inline=True,
                     style={"fontFamily": "DejaVu Sans, Arial, sans-serif", "marginLeft": "10px"}
                 ),
@@ -229,7 +611,7 @@ app.layout = html.Div([
                         {'label': 'X axis title', 'value': 'x_title'},
                         {'label': 'Y axis title', 'value': 'y_title'},
                     ],
-                    value=['plot_title', 'x_title', 'y_title'],
+                    value=DEFAULTS["show_titles"],
                     inline=True,
                     style={"fontFamily": "DejaVu Sans, Arial, sans-serif", "marginLeft": "10px"}
                 ),
@@ -242,7 +624,7 @@ app.layout = html.Div([
                         {'label': 'Show X axis scale', 'value': 'x_scale'},
                         {'label': 'Show Y axis scale', 'value': 'y_scale'},
                     ],
-                    value=['x_scale', 'y_scale'],
+                    value=DEFAULTS["show_axis_scale"],
                     inline=True,
                     style={"fontFamily": "DejaVu Sans, Arial, sans-serif", "marginLeft": "10px"}
                 ),
@@ -267,6 +649,34 @@ app.layout = html.Div([
         }),
 
         html.Div(
+            dash_table.DataTable(
+                id='pair-controls',
+                columns=[
+                    {"name": "Element pair", "id": "pair", "editable": False},
+                    {"name": "Color", "id": "color", "presentation": "dropdown"},
+                    {"name": "Show", "id": "show", "presentation": "dropdown"},
+                    {"name": "ICOHP/ICOOP", "id": "icohp", "presentation": "dropdown"},
+                ],
+                data=[],
+                editable=True,
+                virtualization=True,
+                fixed_rows={"headers": True},
+                page_action='none',
+                dropdown={
+                    "color": {"options": [{"label": c, "value": c} for c in PAIR_COLORS], "clearable": False},
+                    "show": {"options": TOGGLE_OPTIONS, "clearable": False},
+                    "icohp": {"options": TOGGLE_OPTIONS, "clearable": False},
+                },
+                style_table={"height": "600px", "overflowY": "auto", "marginTop": "20px"},
+                style_cell={"textAlign": "center", "padding": "10px", "fontFamily": "DejaVu Sans, Arial, sans-serif",
+                            "fontSize": "16px", "minWidth": "70px"},
+                style_header={"backgroundColor": "#f2f2f2", "fontWeight": "bold"},
+                style_data={"borderBottom": "1px solid #ddd"},
+                style_data_conditional=[
+                    {"if": {"filter_query": f'{{color}} = "{c}"', "column_id": "color"}, "color": c, "fontWeight": "bold"}
+                    for c in PAIR_COLORS
+                ],
+            ),
             id='element-pair-table',
             style={
                 "flex": "3",
@@ -296,201 +706,744 @@ app.layout = html.Div([
         "width": "100%"
     }),
 
+    html.Div(id='drilldown-panel', style={
+        "display": "none",
+        "backgroundColor": "#fff",
+        "borderRadius": "10px",
+        "boxShadow": "0px 4px 6px rgba(0, 0, 0, 0.1)",
+        "padding": "20px",
+        "marginTop": "30px",
+        "fontFamily": "DejaVu Sans, Arial, sans-serif",
+    }),
+
+    html.Div([
+        html.H3("Rigid-band Fermi level shift", style={
+            "fontFamily": "DejaVu Sans, Arial, sans-serif", "color": "#333",
+            "marginBottom": "10px", "textDecoration": "underline", "fontSize": "20px"
+        }),
+        html.Div([
+            html.Label("E_F shift (eV):", style={"fontWeight": "bold", "marginRight": "10px"}),
+            html.Div(
+                dcc.Slider(
+                    id='fermi-shift', min=-2, max=2, step=0.01, value=0, updatemode='drag',
+                    marks={m: m for m in ['-2', '-1', '0', '1', '2']},
+                ),
+                style={"width": "400px"}
+            ),
+            dcc.RadioItems(
+                id='fermi-view',
+                options=[
+                    {'label': 'Element pairs', 'value': 'pairs'},
+                    {'label': f'Interactions (top {FERMI_TABLE_INTERACTIONS} by change)', 'value': 'interactions'},
+                ],
+                value='pairs',
+                inline=True,
+                style={"marginLeft": "10px"}
+            ),
+        ], style={"display": "flex", "alignItems": "center", "marginBottom": "10px"}),
+        dash_table.DataTable(
+            id='fermi-table',
+            columns=[
+                {"name": "Pair / interaction", "id": "name"},
+                {"name": "-ICOHP (eV)", "id": "icohp", "type": "numeric"},
+                {"name": "Δ -ICOHP vs E_F", "id": "d_cohp", "type": "numeric"},
+                {"name": "ICOOP", "id": "icoop", "type": "numeric"},
+                {"name": "Δ ICOOP vs E_F", "id": "d_coop", "type": "numeric"},
+            ],
+            data=[],
+            page_size=BOND_TABLE_PAGE_SIZE,
+            style_cell={"fontFamily": "DejaVu Sans, Arial, sans-serif", "fontSize": "14px", "padding": "6px"},
+            style_header={"backgroundColor": "#f2f2f2", "fontWeight": "bold"},
+        ),
+    ], style={
+        "backgroundColor": "#fff",
+        "borderRadius": "10px",
+        "boxShadow": "0px 4px 6px rgba(0, 0, 0, 0.1)",
+        "padding": "20px",
+        "marginTop": "30px",
+        "fontFamily": "DejaVu Sans, Arial, sans-serif",
+    }),
+
+    html.Div([
+        html.H3("Bond table (ICOHPLIST / ICOOPLIST)", style={
+            "fontFamily": "DejaVu Sans, Arial, sans-serif", "color": "#333",
+            "marginBottom": "10px", "textDecoration": "underline", "fontSize": "20px"
+        }),
+        dash_table.DataTable(
+            id='bond-table',
+            columns=[
+                {"name": "Bond", "id": "bond", "type": "numeric"},
+                {"name": "Atom 1", "id": "atom1"},
+                {"name": "Atom 2", "id": "atom2"},
+                {"name": "Distance (Å)", "id": "distance", "type": "numeric"},
+                {"name": "Translation", "id": "translation"},
+                {"name": "ICOHP at E_F (eV)", "id": "icohp", "type": "numeric"},
+                {"name": "ICOOP at E_F", "id": "icoop", "type": "numeric"},
+            ],
+            data=[],
+            page_current=0,
+            page_size=BOND_TABLE_PAGE_SIZE,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='single',
+            sort_by=[],
+            filter_action='custom',
+            filter_query='',
+            style_cell={"fontFamily": "DejaVu Sans, Arial, sans-serif", "fontSize": "14px", "padding": "6px"},
+            style_header={"backgroundColor": "#f2f2f2", "fontWeight": "bold"},
+        ),
+    ], style={
+        "backgroundColor": "#fff",
+        "borderRadius": "10px",
+        "boxShadow": "0px 4px 6px rgba(0, 0, 0, 0.1)",
+        "padding": "20px",
+        "marginTop": "30px",
+        "fontFamily": "DejaVu Sans, Arial, sans-serif",
+    }),
+
     html.Div(id="save-confirmation", style={
         "marginTop": "10px", "color": "#4CAF50", "fontFamily": "DejaVu Sans, Arial, sans-serif"
     }),
 
     dcc.Store(id='uploaded-contents'),
+    dcc.Store(id='gallery-job'),
+    dcc.Interval(id='gallery-poll', interval=500, disabled=True),
     dcc.Store(id='element-pair-defaults'),
+    dcc.Store(id='fermi-marker-cohp'),
+    dcc.Store(id='fermi-marker-coop'),
     html.Div(id='folder-name', style={"display": "none"}),
     dcc.Download(id='download-plot'),
     dcc.Download(id='download-coop-plot'),
+    dcc.Download(id='download-curves'),
     html.Div(id="save-coop-confirmation", style={
         "marginTop": "10px", "color": "#4CAF50", "fontFamily": "DejaVu Sans, Arial, sans-serif"
     }),
 ])
 
-# --- Demo file callback ---
+# --- Demo file callback: hand out the dataset parsed at startup, no upload round trip ---
 @app.callback(
-    Output('upload-data', 'contents', allow_duplicate=True),
+    Output('uploaded-contents', 'data', allow_duplicate=True),
+    Output('folder-name', 'children', allow_duplicate=True),
+    Output('compound-gallery', 'children', allow_duplicate=True),
+    Output('gallery-job', 'data', allow_duplicate=True),
+    Output('gallery-poll', 'disabled', allow_duplicate=True),
     Input('demo-file', 'n_clicks'),
+    State('gallery-job', 'data'),
     prevent_initial_call=True
 )
-def load_demo_file(n_clicks):
-    if n_clicks:
-        demo_path = os.path.join(os.path.dirname(__file__), DEMO_FILE)
-        if not os.path.exists(demo_path):
-            return dash.no_update
-        with open(demo_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode()
-        mime_type = mimetypes.guess_type(demo_path)[0] or "application/zip"
-        contents = f"data:{mime_type};base64,{encoded}"
-        return contents
-    return dash.no_update
-
-# --- Upload handler: parse ZIP, extract COHPCAR, parse element pairs ---
+def load_demo_file(n_clicks, previous_job):
+    compound = PINNED_DATASETS.get(DEMO_DATASET_ID)
+    if not n_clicks or compound is None:
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    cancel_gallery_job(previous_job)
+    return dataset_summary(DEMO_DATASET_ID, compound), compound["folder_name"], [], None, True
+
+def demo_figure(kind, data, inputs):
+    # Prebuilt demo figure, when the plot inputs are exactly the defaults it was built from
+    cached = DEMO_FIGURES.get(kind)
+    if cached and data and data.get("dataset_id") == DEMO_DATASET_ID and cached[0] == inputs:
+        return cached[1]
+    return None
+
+# --- Upload handler: parse ZIP, extract COHPCAR/COOPCAR for every compound folder ---
 @app.callback(
     Output('uploaded-contents', 'data'),
     Output('folder-name', 'children'),
+    Output('compound-gallery', 'children'),
+    Output('gallery-job', 'data'),
+    Output('gallery-poll', 'disabled'),
     Input('upload-data', 'contents'),
     State('upload-data', 'filename'),
+    State('gallery-job', 'data'),
     prevent_initial_call=True
 )
-def handle_upload(contents, filename):
+def handle_upload(contents, filename, previous_job):
     if not contents:
         raise PreventUpdate
+    cancel_gallery_job(previous_job)
+    sweep_gallery_jobs()
     content_type, content_string = contents.split(',')
     decoded = base64.b64decode(content_string)
     with zipfile.ZipFile(BytesIO(decoded), 'r') as zip_ref:
-        files = zip_ref.namelist()
-        cohp_file = next((f for f in files if "COHPCAR" in f), None)
-        coop_file = next((f for f in files if "COOPCAR" in f), None)
-        cohp_data = zip_ref.read(cohp_file).decode('utf-8') if cohp_file else None
-        coop_data = zip_ref.read(coop_file).decode('utf-8') if coop_file else None
+        compounds = find_compounds(zip_ref.namelist())
 
         # Use DEMO_FILE name if filename is None or "COHP"
         if not filename or filename == "COHP":
-            folder_name = os.path.splitext(os.path.basename(DEMO_FILE))[0]
+            archive_name = os.path.splitext(os.path.basename(DEMO_FILE))[0]
         else:
-            folder_name = os.path.splitext(os.path.basename(filename))[0]
-
-        # Parse unique element pairs (from whichever file exists)
-        unique_pairs = set()
-        for file_data in [cohp_data, coop_data]:
-            if file_data:
-                for line in file_data.splitlines():
-                    if line.startswith("No."):
-                        match = re.search(r":([A-Za-z]+)\d+->([A-Za-z]+)\d+\(", line)
-                        if match:
-                            atom1, atom2 = match.groups()
-                            pair = (atom1, atom2) if atom1 == atom2 else tuple(sorted([atom1, atom2]))
-                            unique_pairs.add(pair)
-        return {
-            "cohp_data": cohp_data,
-            "coop_data": coop_data,
-            "unique_pairs": sorted(list(unique_pairs)),
-            "folder_name": folder_name,
-        }, folder_name
-
-# --- Build element pair color table ---
+            archive_name = os.path.splitext(os.path.basename(filename))[0]
+
+        def read_members(members, streamed=(), spooled=()):
+            # Keys in streamed are handed over as open zip members, keys in spooled
+            # as paths of temp files extracted from the archive, the rest as bytes
+            files = {}
+            for key, member in members.items():
+                if key in streamed:
+                    files[key] = zip_ref.open(member)
+                elif key in spooled:
+                    files[key] = spool_to_disk(zip_ref.open(member))
+                else:
+                    files[key] = zip_ref.read(member)
+            return files
+
+        # Single compound: parse inline, no pool start-up cost; the DOSCAR, often the
+        # biggest file, is decompressed straight into its memory-mapped block
+        if len(compounds) <= 1:
+            members = next(iter(compounds.values()), {})
+            try:
+                compound = parse_compound(archive_name, read_members(members, streamed=("doscar",)))
+            except Exception as error:
+                # Reported as an error tile, as for the folders of a multi-compound archive
+                return None, archive_name, [build_gallery_error(archive_name, parse_error_text(error))], None, True
+            dataset_id = store_dataset(compound)
+            return dataset_summary(dataset_id, compound), archive_name, [], None, True
+
+        # The DOSCAR goes to the workers as a temp file, removed once its parse is over
+        pending = {}
+        for folder, members in sorted(compounds.items()):
+            folder_name = os.path.basename(folder) or archive_name
+            files = read_members(members, spooled=("doscar",))
+            future = submit_job(parse_compound, folder_name, files)
+            spooled = [files["doscar"]] if "doscar" in files else []
+            future.add_done_callback(lambda _, spooled=spooled: remove_files(spooled))
+            pending[future] = folder_name
+
+    # Block only until the first compound is ready; the rest stream into the gallery
+    job_id = uuid.uuid4().hex
+    with _cache_lock:
+        GALLERY_JOBS[job_id] = {"pending": pending, "polled": time.monotonic()}
+    wait(pending, return_when=FIRST_COMPLETED)
+    results, failures, remaining = collect_gallery_results(job_id)
+    gallery = [build_gallery_item(dataset_id, compound) for dataset_id, compound in results]
+    gallery += [build_gallery_error(folder_name, error) for folder_name, error in failures]
+    if not results:
+        # Nothing to plot yet: clear the previous dataset so the poll selects the first success
+        return None, dash.no_update, gallery, job_id, remaining == 0
+    dataset_id, compound = results[0]
+    return dataset_summary(dataset_id, compound), compound["folder_name"], gallery, job_id, remaining == 0
+
+def discard_future_result(future):
+    # Done-callback for abandoned parses: nobody will store the compound, so drop its files
+    if not future.cancelled() and future.exception() is None:
+        discard_compound(future.result())
+
+def cancel_gallery_job(job_id):
+    with _cache_lock:
+        job = GALLERY_JOBS.pop(job_id, None) if job_id else None
+    for future in job["pending"] if job else ():
+        if not future.cancel():
+            # Already running or finished; clean up whatever it produces
+            future.add_done_callback(discard_future_result)
+
+def sweep_gallery_jobs():
+    # Drop jobs whose client stopped polling, so their parsed compounds are not kept forever
+    now = time.monotonic()
+    with _cache_lock:
+        stale = [job_id for job_id, job in GALLERY_JOBS.items() if now - job["polled"] > GALLERY_JOB_TTL]
+    for job_id in stale:
+        cancel_gallery_job(job_id)
+
+def collect_gallery_results(job_id):
+    # Pop the parses that finished since the last poll: stored datasets, and
+    # (folder name, error message) for the folders that failed to parse
+    with _cache_lock:
+        job = GALLERY_JOBS.get(job_id, {"pending": {}})
+        job["polled"] = time.monotonic()
+        pending = job["pending"]
+        finished = [(future, pending.pop(future)) for future in list(pending) if future.done()]
+        remaining = len(pending)
+        if not pending:
+            GALLERY_JOBS.pop(job_id, None)
+    results = []
+    failures = []
+    for future, folder_name in finished:
+        if future.cancelled():
+            continue
+        error = future.exception()
+        if error is not None:
+            failures.append((folder_name, parse_error_text(error)))
+            continue
+        compound = future.result()
+        results.append((store_dataset(compound), compound))
+    return results, failures, remaining
+
+def parse_error_text(error):
+    return f"{type(error).__name__}: {error}"
+
+def build_gallery_error(folder_name, error):
+    # Tile for a folder whose parse failed, in place of its thumbnail
+    return html.Div([
+        html.Div(subscript_numbers(folder_name), style={"fontWeight": "bold", "marginBottom": "6px"}),
+        html.Div("Could not be parsed:", style={"marginBottom": "4px"}),
+        html.Div(error, style={"fontSize": "11px", "wordBreak": "break-word"}),
+    ], title=error, style={
+        "width": "120px", "height": "200px", "padding": "5px", "boxSizing": "border-box", "overflow": "hidden",
+        "borderRadius": "5px", "border": "1px solid #d9534f", "color": "#d9534f", "backgroundColor": "#fff",
+        "fontFamily": "DejaVu Sans, Arial, sans-serif", "fontSize": "12px",
+        "boxShadow": "0px 4px 6px rgba(0, 0, 0, 0.1)"
+    })
+
+def build_gallery_item(dataset_id, compound):
+    # Downsampled overview of one compound; the full plots are built only once it is clicked
+    fig = go.Figure()
+    kind = "cohp" if compound["cohp"] else "coop"
+    parsed = compound[kind]
+    if parsed:
+        step = max(1, len(parsed["energy"]) // THUMBNAIL_POINTS)
+        p_mat, _ = broadened_pair_curves(compound, kind)
+        for i, p_sum in enumerate(p_mat):
+            fig.add_trace(go.Scatter(
+                x=p_sum[::step], y=parsed["energy"][::step],
+                mode='lines',
+                line=dict(width=1, color=PAIR_COLOR_CYCLE[i % len(PAIR_COLOR_CYCLE)])
+            ))
+    fig.add_hline(y=0, line_dash="dash", line_color="black", line_width=1)
+    fig.update_layout(
+        title=dict(text=subscript_numbers(compound["folder_name"]), x=0.5, xanchor='center',
+                   font=dict(size=12, family="DejaVu Sans, Arial, sans-serif")),
+        showlegend=False,
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False, range=[DEFAULTS["ymin"], DEFAULTS["ymax"]]),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        margin=dict(l=5, r=5, t=30, b=5),
+        height=200,
+        width=120,
+    )
+    return html.Div(
+        dcc.Graph(figure=fig, config={"staticPlot": True}),
+        id={'type': 'gallery-item', 'index': dataset_id},
+        n_clicks=0,
+        style={
+            "cursor": "pointer", "borderRadius": "5px", "border": "1px solid #ccc",
+            "boxShadow": "0px 4px 6px rgba(0, 0, 0, 0.1)"
+        }
+    )
+
+# --- Gallery polling: append compounds as their parses finish ---
+@app.callback(
+    Output('compound-gallery', 'children', allow_duplicate=True),
+    Output('gallery-poll', 'disabled', allow_duplicate=True),
+    Output('uploaded-contents', 'data', allow_duplicate=True),
+    Output('folder-name', 'children', allow_duplicate=True),
+    Input('gallery-poll', 'n_intervals'),
+    State('gallery-job', 'data'),
+    State('uploaded-contents', 'data'),
+    prevent_initial_call=True
+)
+def poll_gallery(n_intervals, job_id, data):
+    if not job_id:
+        return dash.no_update, True, dash.no_update, dash.no_update
+    sweep_gallery_jobs()
+    results, failures, remaining = collect_gallery_results(job_id)
+    if not results and not failures and remaining:
+        raise PreventUpdate
+    gallery = Patch()
+    for dataset_id, compound in results:
+        gallery.append(build_gallery_item(dataset_id, compound))
+    for folder_name, error in failures:
+        gallery.append(build_gallery_error(folder_name, error))
+    if results and not data:
+        # Every folder that finished before this one failed: plot the first success
+        dataset_id, compound = results[0]
+        return gallery, remaining == 0, dataset_summary(dataset_id, compound), compound["folder_name"]
+    return gallery, remaining == 0, dash.no_update, dash.no_update
+
+# --- Local run folders: indexed in the background, full rescan on request, opened straight from disk ---
+@app.callback(
+    Output('run-folder', 'options'),
+    Input('rescan-runs', 'n_clicks'),
+)
+def rescan_run_folders(n_clicks):
+    if not DATA_ROOT:
+        raise PreventUpdate
+    if not n_clicks:
+        # Page load: serve the current index and never walk the tree on the request
+        start_background_scan(DATA_ROOT)
+        with _index_lock:
+            return sorted(RUN_INDEX)
+    return scan_run_directory(DATA_ROOT, force=True)
+
+@app.callback(
+    Output('uploaded-contents', 'data', allow_duplicate=True),
+    Output('folder-name', 'children', allow_duplicate=True),
+    Input('run-folder', 'value'),
+    prevent_initial_call=True
+)
+def select_run_folder(folder):
+    if not folder or not DATA_ROOT:
+        raise PreventUpdate
+    dataset_id, compound = open_run_folder(folder)
+    if compound is None:
+        raise PreventUpdate
+    return dataset_summary(dataset_id, compound), compound["folder_name"]
+
+# --- Gallery selection: load the full plots of the clicked compound ---
+@app.callback(
+    Output('uploaded-contents', 'data', allow_duplicate=True),
+    Output('folder-name', 'children', allow_duplicate=True),
+    Input({'type': 'gallery-item', 'index': ALL}, 'n_clicks'),
+    prevent_initial_call=True
+)
+def select_gallery_item(n_clicks):
+    if not ctx.triggered_id or not ctx.triggered[0]["value"]:
+        raise PreventUpdate
+    dataset_id = ctx.triggered_id["index"]
+    compound = get_dataset({"dataset_id": dataset_id})
+    if compound is None:
+        raise PreventUpdate
+    return dataset_summary(dataset_id, compound), compound["folder_name"]
+
+# --- Orbital channels available in orbital-wise COHPCAR/COOPCAR files ---
+@app.callback(
+    Output('orbital-channels', 'options'),
+    Output('orbital-channels', 'value'),
+    Output('orbital-controls', 'style'),
+    Input('uploaded-contents', 'data'),
+    State('orbital-controls', 'style'),
+    prevent_initial_call=True
+)
+def update_orbital_options(data, style):
+    compound = get_dataset(data)
+    channels = set()
+    for kind in ("cohp", "coop"):
+        if compound and compound[kind]:
+            channels.update(compound[kind]["orbital_columns"])
+    return sorted(channels), [], {**style, "display": "flex" if channels else "none"}
+
+# --- Spin view toggle, shown for spin-polarized (ISPIN = 2) files only ---
+@app.callback(
+    Output('spin-view', 'style'),
+    Input('uploaded-contents', 'data'),
+    State('spin-view', 'style'),
+    prevent_initial_call=True
+)
+def update_spin_view(data, style):
+    return {**style, "display": "block" if data and data.get("spin_polarized") else "none"}
+
+# --- Projected DOS panel, shown when the folder has a DOSCAR.lobster ---
+@app.callback(
+    Output('dos-projections', 'options'),
+    Output('dos-projections', 'value'),
+    Output('dos-panel', 'style'),
+    Input('uploaded-contents', 'data'),
+    State('dos-panel', 'style'),
+    prevent_initial_call=True
+)
+def update_dos_options(data, style):
+    compound = get_dataset(data)
+    dos = compound.get("dos") if compound else None
+    if not dos:
+        return [], [], {**style, "display": "none"}
+    names = list(dos["projections"])
+    # Element totals by default; per orbital type on request
+    return names, [name for name in names if " " not in name and name != "Total"], {**style, "display": "flex"}
+
+# --- Build element pair control table ---
 @app.callback(
-    Output('element-pair-table', 'children'),
+    Output('pair-controls', 'data'),
     Input('uploaded-contents', 'data'),
     prevent_initial_call=True
 )
 def build_element_pair_table(data):
     if not data or "unique_pairs" not in data:
-        return ""
-    color_options = [
-        {'label': html.Span([
-            html.Div(style={
-                "backgroundColor": c, "width": "15px", "height": "15px",
-                "display": "inline-block", "marginRight": "8px"
-            }), c
-        ], style={"display": "flex", "alignItems": "center"}), "value": c}
-        for c in ['blue', 'red', 'green', 'gray', 'black', 'orange', 'purple', 'pink', 'silver']
+        return []
+    return [
+        {
+            "pair": f"{pair[0]}-{pair[1]}",
+            "color": PAIR_COLOR_CYCLE[i % len(PAIR_COLOR_CYCLE)],
+            "show": "yes",
+            "icohp": "no",  # Not shown by default
+        }
+        for i, pair in enumerate(data["unique_pairs"])
     ]
-    table_header = html.Tr([
-        html.Th("Element pair", style={"textAlign": "center", "padding": "10px", "fontWeight": "bold"}),
-        html.Th("Color", style={"textAlign": "center", "padding": "10px", "fontWeight": "bold"}),
-        html.Th("Show", style={"textAlign": "center", "padding": "10px", "fontWeight": "bold"}),
-        html.Th("ICOHP/ICOOP", style={"textAlign": "center", "padding": "10px", "fontWeight": "bold"}),
-    ], style={"backgroundColor": "#f2f2f2"})
-    table_rows = []
-    color_cycle = ['red', 'green', 'blue', 'orange']
-    for i, pair in enumerate(data["unique_pairs"]):
+
+def pair_state_maps(data, pair_state):
+    # Color / show / ICOHP lookups for every pair from the control table rows
+    state = {row["pair"]: row for row in pair_state or []}
+    pairs = [f"{p[0]}-{p[1]}" for p in data["unique_pairs"]]
+    color_map = {pair: state.get(pair, {}).get("color", 'blue') for pair in pairs}
+    show_map = {pair: state.get(pair, {}).get("show", "yes") == "yes" for pair in pairs}
+    icohp_map = {pair: state.get(pair, {}).get("icohp", "no") == "yes" for pair in pairs}
+    return color_map, show_map, icohp_map
+
+# --- Bond table: server-side paging, sorting and filtering ---
+@app.callback(
+    Output('bond-table', 'data'),
+    Output('bond-table', 'page_count'),
+    Output('bond-table', 'page_current'),
+    Input('uploaded-contents', 'data'),
+    Input('bond-table', 'page_current'),
+    Input('bond-table', 'page_size'),
+    Input('bond-table', 'sort_by'),
+    Input('bond-table', 'filter_query'),
+    prevent_initial_call=True
+)
+def update_bond_table(data, page_current, page_size, sort_by, filter_query):
+    compound = get_dataset(data)
+    if not compound or not compound.get("bonds"):
+        return [], 1, 0
+    # A new dataset, sort or filter starts again from the first page
+    if any(t["prop_id"] != 'bond-table.page_current' for t in ctx.triggered):
+        page_current = 0
+    records, page_count = bond_table_page(
+        compound["bonds"], page_current or 0, page_size or BOND_TABLE_PAGE_SIZE, sort_by, filter_query)
+    return records, page_count, page_current
+
+def scatter_type(parsed, show_map, icohp_map, orbital_channels):
+    # WebGL traces once the figure would hold more points than SVG redraws comfortably
+    n_traces = sum(show_map.values()) + sum(show_map[p] and icohp_map[p] for p in show_map)
+    n_traces += len(orbital_channels or [])
+    return go.Scattergl if n_traces * len(parsed["energy"]) > WEBGL_POINT_BUDGET else go.Scatter
+
+def svg_figure(figure):
+    # Kaleido exports always use SVG traces so saved plots do not depend on the WebGL switch
+    figure = dict(figure, data=[
+        dict(trace, type="scatter") if trace.get("type") == "scattergl" else trace
+        for trace in figure.get("data", [])
+    ])
+    return pio.from_json(pio.to_json(figure))
+
+def trace_pairs(data, pair_state):
+    # Element pair behind each trace index of the plots, in the order they are drawn
+    _, show_map, icohp_map = pair_state_maps(data, pair_state)
+    pairs = []
+    for pair in data["unique_pairs"]:
         pair_str = f"{pair[0]}-{pair[1]}"
-        default_color = color_cycle[i % len(color_cycle)]
-        table_rows.append(html.Tr([
-            html.Td(pair_str, style={"textAlign": "center", "padding": "10px"}),
-            html.Td(
-                dcc.Dropdown(
-                    id={'type': 'color-dropdown', 'index': pair_str},
-                    options=color_options,
-                    value=default_color,
-                    clearable=False,
-                    style={"width": "100px"}
-                ),
-                style={"textAlign": "center", "padding": "10px"}
-            ),
-            html.Td(
-                dcc.Checklist(
-                    id={'type': 'toggle-pair', 'index': pair_str},
-                    options=[{'label': '', 'value': 'show'}],
-                    value=['show'],
-                    inline=True
-                ),
-                style={"textAlign": "center", "padding": "10px"}
-            ),
-            html.Td(
-                dcc.Checklist(
-                    id={'type': 'toggle-icohp', 'index': pair_str},
-                    options=[{'label': '', 'value': 'icohp'}],
-                    value=[],  # Not shown by default
-                    inline=True
-                ),
-                style={"textAlign": "center", "padding": "10px"}
-            ),
-        ], style={"borderBottom": "1px solid #ddd"}))
-    table = html.Table([table_header] + table_rows, style={
-        "width": "100%", "borderCollapse": "collapse", "marginTop": "20px"
+        if show_map[pair_str]:
+            pairs += [pair] * (2 if icohp_map[pair_str] else 1)
+    return pairs
+
+# --- Drill-down: top interactions of a clicked pair, loaded only on click ---
+@app.callback(
+    Output('drilldown-panel', 'children'),
+    Output('drilldown-panel', 'style'),
+    Input('cohp-plot', 'clickData'),
+    Input('coop-plot', 'clickData'),
+    Input('uploaded-contents', 'data'),
+    State('pair-controls', 'data'),
+    State('broadening-sigma', 'value'),
+    State('broadening-shape', 'value'),
+    State('spin-view', 'value'),
+    State('drilldown-panel', 'style'),
+    prevent_initial_call=True
+)
+def drill_down_pair(cohp_click, coop_click, data, pair_state, sigma, shape, spin, style):
+    hidden = [], {**style, "display": "none"}
+    compound = get_dataset(data)
+    if not compound or ctx.triggered_id not in ('cohp-plot', 'coop-plot'):
+        return hidden
+    kind = "cohp" if ctx.triggered_id == 'cohp-plot' else "coop"
+    click = cohp_click if kind == "cohp" else coop_click
+    pairs = trace_pairs(data, pair_state)
+    curve = click["points"][0]["curveNumber"] if click and click.get("points") else None
+    if curve is None or curve >= len(pairs) or not compound[kind]:
+        return hidden
+    parsed = compound[kind]
+    pair = pairs[curve]
+    pair_str = f"{pair[0]}-{pair[1]}"
+    sign, p_name, i_name = (-1, "-pCOHP", "-ICOHP") if kind == "cohp" else (1, "pCOOP", "ICOOP")
+    members, at_fermi = rank_pair_interactions(parsed, pair, sign, DRILLDOWN_TOP_N, spin)
+    energy = parsed["energy"]
+    curves = sign * spin_columns(parsed, [parsed["interaction_columns"][k] for k in members], spin).T
+    if sigma and len(energy) > 1 and len(members):
+        curves = broaden_matrix(energy, curves, sigma, shape)
+    labels = [parsed["labels"][k].split(":", 1)[-1] for k in members]
+    fig = go.Figure()
+    for j, (label, curve_values) in enumerate(zip(labels, curves)):
+        fig.add_trace(go.Scatter(
+            x=curve_values, y=energy,
+            mode='lines',
+            name=label,
+            line=dict(width=1.5, color=PAIR_COLORS[j % len(PAIR_COLORS)])
+        ))
+    fig.add_hline(y=0, line_dash="dash", line_color="black", line_width=1)
+    fig.update_layout(
+        font=dict(family="DejaVu Sans, Arial, sans-serif", size=14, color='black'),
+        xaxis=dict(title=p_name, showgrid=False, zeroline=True, zerolinecolor='black'),
+        yaxis=dict(title='Energy (eV)', range=[DEFAULTS["ymin"], DEFAULTS["ymax"]], showgrid=False),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        margin=dict(l=50, r=20, t=20, b=50),
+        height=500,
+        width=700,
+    )
+    table = html.Table(
+        [html.Tr([
+            html.Th("#", style={"padding": "6px"}),
+            html.Th("Interaction", style={"padding": "6px"}),
+            html.Th(f"{i_name} at E_F", style={"padding": "6px"}),
+        ], style={"backgroundColor": "#f2f2f2"})] +
+        [html.Tr([
+            html.Td(rank + 1, style={"padding": "6px"}),
+            html.Td(label, style={"padding": "6px"}),
+            html.Td(f"{value:.4f}", style={"padding": "6px", "textAlign": "right"}),
+        ], style={"borderBottom": "1px solid #ddd"}) for rank, (label, value) in enumerate(zip(labels, at_fermi))],
+        style={"borderCollapse": "collapse", "marginLeft": "20px"}
+    )
+    title = html.H3(f"Top {len(members)} {pair_str} interactions by {i_name} at E_F", style={
+        "fontFamily": "DejaVu Sans, Arial, sans-serif", "color": "#333",
+        "marginBottom": "10px", "textDecoration": "underline", "fontSize": "20px"
     })
-    return table
-
-def get_dynamic_xrange(energy, y_min, y_max, traces):
-    # traces: list of np.arrays, each is a pCOHP or pCOOP sum
-    mask = (energy >= y_min) & (energy <= y_max)
-    max_abs = 0
-    for arr in traces:
-        if arr is not None and arr.shape == energy.shape:
-            arr_in_window = arr[mask]
-            if arr_in_window.size > 0:
-                max_abs = max(max_abs, np.max(np.abs(arr_in_window)))
-    if max_abs == 0:
-        max_abs = 1  # fallback to avoid zero width
-    buffer = max_abs * 0.05
-    return -max_abs - buffer, max_abs + buffer
+    body = html.Div([dcc.Graph(figure=fig), table], style={"display": "flex", "alignItems": "flex-start"})
+    return [title, body], {**style, "display": "block"}
+
+# The marker shape / annotation carry a name; the plot callbacks store where they
+# ended up so the slider can move them with a Patch instead of rebuilding the figures
+FERMI_MARKER_NAME = "fermi-marker"
+
+def add_fermi_marker(fig, fermi_shift):
+    fermi_shift = fermi_shift or 0
+    fig.add_shape(
+        name=FERMI_MARKER_NAME,
+        type="line",
+        x0=0, x1=1, y0=fermi_shift, y1=fermi_shift,
+        xref="paper", yref="y",
+        line=dict(color="gray", width=2, dash="dot"),
+        visible=bool(fermi_shift)
+    )
+    fig.add_annotation(
+        name=FERMI_MARKER_NAME,
+        x=0.02, y=fermi_shift,
+        xref="paper", yref="y",
+        text=fermi_marker_text(fermi_shift),
+        showarrow=False,
+        font=dict(size=16, family="DejaVu Sans, Arial, sans-serif", color="gray"),
+        xanchor="left",
+        yanchor="bottom",
+        visible=bool(fermi_shift)
+    )
+
+def fermi_marker_text(fermi_shift):
+    return f"<i>E</i><sub><i>F</i></sub> {fermi_shift:+.2f} eV"
+
+def fermi_marker_indexes(fig):
+    # Positions of the named marker shape / annotation, None when the figure has none
+    shapes = [i for i, item in enumerate(fig.layout.shapes) if item.name == FERMI_MARKER_NAME]
+    annotations = [i for i, item in enumerate(fig.layout.annotations) if item.name == FERMI_MARKER_NAME]
+    if not shapes or not annotations:
+        return None
+    return {"shape": shapes[0], "annotation": annotations[0]}
+
+# --- Rigid-band E_F slider: move the marker on both plots ---
+@app.callback(
+    Output('cohp-plot', 'figure', allow_duplicate=True),
+    Output('coop-plot', 'figure', allow_duplicate=True),
+    Input('fermi-shift', 'value'),
+    State('fermi-marker-cohp', 'data'),
+    State('fermi-marker-coop', 'data'),
+    prevent_initial_call=True
+)
+def move_fermi_marker(fermi_shift, cohp_marker, coop_marker):
+    fermi_shift = fermi_shift or 0
+    patches = []
+    for marker in (cohp_marker, coop_marker):
+        if not marker:
+            patches.append(dash.no_update)
+            continue
+        patch = Patch()
+        shape = patch["layout"]["shapes"][marker["shape"]]
+        shape["y0"] = fermi_shift
+        shape["y1"] = fermi_shift
+        shape["visible"] = bool(fermi_shift)
+        annotation = patch["layout"]["annotations"][marker["annotation"]]
+        annotation["y"] = fermi_shift
+        annotation["text"] = fermi_marker_text(fermi_shift)
+        annotation["visible"] = bool(fermi_shift)
+        patches.append(patch)
+    return patches
+
+def interaction_keys(parsed):
+    # (label without LOBSTER's "No.n:" prefix, occurrence) per interaction; the
+    # occurrence count keeps repeated labels apart
+    seen = {}
+    keys = []
+    for label in parsed["labels"]:
+        name = label.split(":", 1)[-1]
+        keys.append((name, seen.get(name, 0)))
+        seen[name] = seen.get(name, 0) + 1
+    return keys
+
+# --- Rigid-band E_F slider: integrated populations up to the shifted Fermi level ---
+@app.callback(
+    Output('fermi-table', 'data'),
+    Input('fermi-shift', 'value'),
+    Input('fermi-view', 'value'),
+    Input('uploaded-contents', 'data'),
+    Input('spin-view', 'value'),
+    Input('broadening-sigma', 'value'),
+    Input('broadening-shape', 'value'),
+    prevent_initial_call=True
+)
+def update_fermi_table(fermi_shift, view, data, spin, sigma, shape):
+    compound = get_dataset(data)
+    if not compound:
+        return []
+    fermi_shift = fermi_shift or 0
+    values = {}
+    for kind, sign in (("cohp", -1), ("coop", 1)):
+        if compound[kind]:
+            # Same broadened running integrals the plots draw, so the table matches the curves
+            shifted = rigid_band_integrals(compound, kind, fermi_shift, spin, sigma, shape, view)
+            at_fermi = rigid_band_integrals(compound, kind, 0.0, spin, sigma, shape, view)
+            values[kind] = (sign * shifted, sign * (shifted - at_fermi))
+    if view == "interactions":
+        # COHPCAR and COOPCAR may list different interactions: rows are matched by label
+        positions = {kind: {key: i for i, key in enumerate(interaction_keys(compound[kind]))} for kind in values}
+        keys = list(dict.fromkeys(key for kind in values for key in positions[kind]))
+    else:
+        keys = [(f"{p[0]}-{p[1]}", 0) for p in compound["unique_pairs"]]
+        positions = {kind: {key: i for i, key in enumerate(keys)} for kind in values}
+    rows = []
+    for key in keys:
+        row = {"name": key[0]}
+        for kind in values:
+            i = positions[kind].get(key)
+            if i is not None:
+                row[f"i{kind}"] = round(float(values[kind][0][i]), 4)
+                row[f"d_{kind}"] = round(float(values[kind][1][i]), 4)
+        rows.append(row)
+    if view == "interactions":
+        rows.sort(key=lambda row: -abs(row.get("d_cohp", row.get("d_coop", 0))))
+        rows = rows[:FERMI_TABLE_INTERACTIONS]
+    return rows
 
 # --- Plot callback ---
 @app.callback(
     Output('cohp-plot', 'figure'),
+    Output('fermi-marker-cohp', 'data'),
     Input('uploaded-contents', 'data'),
-    Input({'type': 'color-dropdown', 'index': ALL}, 'value'),
-    Input({'type': 'toggle-pair', 'index': ALL}, 'value'),
-    Input({'type': 'toggle-icohp', 'index': ALL}, 'value'),
+    Input('pair-controls', 'data'),
     Input('xmin-cohp', 'value'), Input('xmax-cohp', 'value'),
     Input('ymin-cohp', 'value'), Input('ymax-cohp', 'value'),
     Input('legend-y-cohp', 'value'),
     Input('legend-x-cohp', 'value'),
     Input('show-titles-cohp', 'value'),
     Input('show-axis-scale-cohp', 'value'),
+    Input('broadening-sigma', 'value'),
+    Input('broadening-shape', 'value'),
+    Input('orbital-channels', 'value'),
+    Input('spin-view', 'value'),
+    State('fermi-shift', 'value'),
     prevent_initial_call=True
 )
-def update_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles, show_axis_scale):    
-    if not data or "cohp_data" not in data:
+def render_cohp_plot(data, pair_state, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles, show_axis_scale, sigma, shape, orbital_channels, spin, fermi_shift):
+    fig = update_plot(data, pair_state, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles, show_axis_scale, sigma, shape, orbital_channels, spin, fermi_shift)
+    return fig, fermi_marker_indexes(fig)
+
+def update_plot(data, pair_state, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles, show_axis_scale, sigma, shape, orbital_channels, spin, fermi_shift):
+    figure = demo_figure("cohp", data, (pair_state, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles,
+                                         show_axis_scale, sigma, shape, orbital_channels, spin, fermi_shift))
+    if figure is not None:
+        return figure
+    compound = get_dataset(data)
+    if not compound or not compound["cohp"]:
         return go.Figure()
-    pairs = [f"{p[0]}-{p[1]}" for p in data["unique_pairs"]]
-    color_map = {pair: colors[i] if i < len(colors) else 'blue' for i, pair in enumerate(pairs)}
-    show_map = {pair: ('show' in toggles[i] if i < len(toggles) else True) for i, pair in enumerate(pairs)}
-    icohp_map = {pair: ('icohp' in icohp_toggles[i] if i < len(icohp_toggles) else False) for i, pair in enumerate(pairs)}
-    lines = data["cohp_data"].splitlines()
-    header_idx = next(i for i, line in enumerate(lines) if line.strip().startswith("No.1"))
-    data_start_idx = header_idx + 1
-    numeric_lines = []
-    for line in lines[data_start_idx:]:
-        tokens = line.strip().split()
-        if tokens and re.match(r'^-?\d+\.?\d*([eE][-+]?\d+)?$', tokens[0]):
-            numeric_lines.append(line)
-    data_arr = np.genfromtxt(StringIO("\n".join(numeric_lines)))
-    energy = data_arr[:, 0]
-    interaction_to_pair = []
-    for line in lines:
-        if line.startswith("No."):
-            match = re.search(r":([A-Za-z]+)\d+->([A-Za-z]+)\d+\(", line)
-            if match:
-                atom1, atom2 = match.groups()
-                pair = (atom1, atom2) if atom1 == atom2 else tuple(sorted([atom1, atom2]))
-                interaction_to_pair.append(pair)
+    parsed = compound["cohp"]
+    color_map, show_map, icohp_map = pair_state_maps(data, pair_state)
+    pcohp_mat, icohp_mat = broadened_pair_curves(compound, "cohp", sigma, shape, spin)
+    trace_type = scatter_type(parsed, show_map, icohp_map, orbital_channels)
+    energy = parsed["energy"]
     # --- Dynamic x-range calculation ---
     y_min, y_max = -8, 2
     pcohp_traces = []
@@ -498,12 +1451,7 @@ def update_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, ymax, le
         pair_str = f"{pair[0]}-{pair[1]}"
         if not show_map.get(pair_str, True):
             continue
-        indices = [j for j, p in enumerate(interaction_to_pair) if p == tuple(pair)]
-        pcohp_sum = np.zeros_like(energy)
-        for idx in indices:
-            pcohp_col = 3 + 2 * idx
-            pcohp_sum += -data_arr[:, pcohp_col]
-        pcohp_traces.append(pcohp_sum)
+        pcohp_traces.append(pcohp_mat[i])
     auto_xmin, auto_xmax = get_dynamic_xrange(energy, y_min, y_max, pcohp_traces)
     xmax_val = xmax if xmax is not None else auto_xmax
     xmin_val = xmin if xmin is not None else auto_xmin
@@ -514,16 +1462,9 @@ def update_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, ymax, le
         pair_str = f"{pair[0]}-{pair[1]}"
         if not show_map.get(pair_str, True):
             continue
-        indices = [j for j, p in enumerate(interaction_to_pair) if p == tuple(pair)]
-        pcohp_sum = np.zeros_like(energy)
-        icohp_sum = np.zeros_like(energy)
-        for idx in indices:
-            pcohp_col = 3 + 2 * idx
-            icohp_col = 4 + 2 * idx
-            pcohp_sum += -data_arr[:, pcohp_col]
-            icohp_sum += -data_arr[:, icohp_col]
+        pcohp_sum, icohp_sum = pcohp_mat[i], icohp_mat[i]
         # pCOHP line
-        fig.add_trace(go.Scatter(
+        fig.add_trace(trace_type(
             x=pcohp_sum, y=energy,
             mode='lines',
             name=pair_str,
@@ -531,13 +1472,22 @@ def update_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, ymax, le
         ))
         # ICOHP dashed line if toggled
         if icohp_map.get(pair_str, False):
-            fig.add_trace(go.Scatter(
+            fig.add_trace(trace_type(
                 x=icohp_sum, y=energy,
                 mode='lines',
                 name=f"ICOHP",
                 line=dict(width=2.25, color=color_map.get(pair_str, 'blue'), dash='dash'),
                 showlegend=True
             ))
+    # Orbital-resolved channels, dotted
+    for j, (channel, p_orbital, _) in enumerate(
+            orbital_channel_curves(parsed, orbital_channels or [], -1, sigma, shape, spin)):
+        fig.add_trace(trace_type(
+            x=p_orbital, y=energy,
+            mode='lines',
+            name=channel,
+            line=dict(width=1.75, color=ORBITAL_COLORS[j % len(ORBITAL_COLORS)], dash='dot')
+        ))
     fig.add_hline(y=0, line_dash="dash", line_color="black", line_width=2)
     fig.add_vline(x=0, line_dash="dash", line_color="black", line_width=2)
 
@@ -557,6 +1507,8 @@ def update_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, ymax, le
     folder_name = data.get('folder_name', '') if isinstance(data, dict) else ''
     folder_name_unicode = subscript_numbers(folder_name)
     zip_title = f"{folder_name_unicode} COHP"
+    if parsed["spins"] > 1 and spin in SPIN_LABELS:
+        zip_title += f" ({SPIN_LABELS[spin]})"
     plot_title = zip_title if 'plot_title' in show_titles else None
 
     # --- Axis titles ---
@@ -646,10 +1598,165 @@ def update_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, ymax, le
         fillcolor='rgba(0,0,0,0)'
     )
 
-    # --- Optional: Add Fermi level line ---
+    # --- Rigid-band Fermi level marker, moved by the E_F shift slider ---
+    add_fermi_marker(fig, fermi_shift)
 
     return fig
 
+# --- Projected DOS plot: only the selected projections are read and sent ---
+@app.callback(
+    Output('dos-plot', 'figure'),
+    Input('uploaded-contents', 'data'),
+    Input('dos-projections', 'value'),
+    Input('ymin-cohp', 'value'), Input('ymax-cohp', 'value'),
+    prevent_initial_call=True
+)
+def update_dos_plot(data, projections, ymin, ymax):
+    compound = get_dataset(data)
+    dos = compound.get("dos") if compound else None
+    if not dos:
+        return go.Figure()
+    projections = [name for name in projections or [] if name in dos["projections"]]
+    energy = dos["energy"]
+    curves = dos_curves(dos, projections)
+    ymin_val = ymin if ymin is not None else DEFAULTS["ymin"]
+    ymax_val = ymax if ymax is not None else DEFAULTS["ymax"]
+    _, auto_xmax = get_dynamic_xrange(energy, ymin_val, ymax_val, list(curves))
+    trace_type = go.Scattergl if curves.size > WEBGL_POINT_BUDGET else go.Scatter
+    fig = go.Figure()
+    for j, (name, curve) in enumerate(zip(projections, curves)):
+        fig.add_trace(trace_type(
+            x=curve, y=energy,
+            mode='lines',
+            name=name,
+            line=dict(width=2.25, color=PAIR_COLORS[j % len(PAIR_COLORS)])
+        ))
+    fig.add_hline(y=0, line_dash="dash", line_color="black", line_width=2)
+    fig.update_layout(
+        font=dict(family="DejaVu Sans, Arial, sans-serif", size=22, color='black'),
+        xaxis=dict(
+            title=dict(text='DOS (states/eV)', font=dict(size=22, family="DejaVu Sans, Arial, sans-serif")),
+            range=[0, auto_xmax],
+            showgrid=False,
+            tickfont=dict(size=20, family="DejaVu Sans, Arial, sans-serif"),
+            ticks='outside',
+        ),
+        yaxis=dict(
+            title=dict(text='Energy (eV)', font=dict(size=22, family="DejaVu Sans, Arial, sans-serif")),
+            range=[ymin_val, ymax_val],
+            showgrid=False,
+            zeroline=False,
+            tickfont=dict(size=20, family="DejaVu Sans, Arial, sans-serif"),
+            ticks='outside',
+        ),
+        legend=dict(x=DEFAULTS["legend_x"], y=DEFAULTS["legend_y"], xanchor='right', yanchor='top'),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        margin=dict(l=50, r=50, t=50, b=50),
+        height=725,
+        width=400,
+    )
+    fig.add_shape(
+        type="rect",
+        x0=0, y0=0, x1=1, y1=1,
+        xref="paper", yref="paper",
+        line=dict(color="black", width=2),
+        fillcolor='rgba(0,0,0,0)'
+    )
+    return fig
+
+# --- Linked energy zoom: a y-range drag on one panel is applied to the other two ---
+ENERGY_PLOTS = ('dos-plot', 'cohp-plot', 'coop-plot')
+
+@app.callback(
+    [Output(plot, 'figure', allow_duplicate=True) for plot in ENERGY_PLOTS],
+    [Input(plot, 'relayoutData') for plot in ENERGY_PLOTS],
+    prevent_initial_call=True
+)
+def link_energy_zoom(*relayouts):
+    source = ctx.triggered_id
+    relayout = relayouts[ENERGY_PLOTS.index(source)] or {}
+    if 'yaxis.range[0]' not in relayout or 'yaxis.range[1]' not in relayout:
+        raise PreventUpdate
+    y_range = [relayout['yaxis.range[0]'], relayout['yaxis.range[1]']]
+    patches = []
+    for plot in ENERGY_PLOTS:
+        if plot == source:
+            patches.append(dash.no_update)
+            continue
+        patch = Patch()
+        patch["layout"]["yaxis"]["range"] = y_range
+        patches.append(patch)
+    return patches
+
+# --- Curve export callback ---
+@app.callback(
+    Output('download-curves', 'data'),
+    Input('export-curves', 'n_clicks'),
+    State('export-format', 'value'),
+    State('uploaded-contents', 'data'),
+    State('pair-controls', 'data'),
+    State('broadening-sigma', 'value'),
+    State('broadening-shape', 'value'),
+    State('spin-view', 'value'),
+    prevent_initial_call=True
+)
+def export_curves(n_clicks, export_format, data, pair_state, sigma, shape, spin):
+    compound = get_dataset(data)
+    if not n_clicks or not compound:
+        raise PreventUpdate
+    _, show_map, _ = pair_state_maps(data, pair_state)
+    pairs = [pair for pair in compound["unique_pairs"] if show_map.get(f"{pair[0]}-{pair[1]}", True)]
+    energy, curves = selected_curves(compound, pairs, sigma, shape, spin)
+    if energy is None:
+        raise PreventUpdate
+    if export_format == 'npz':
+        def write_npz(output_buffer):
+            np.savez_compressed(output_buffer, energy=energy, **curves)
+        return dcc.send_bytes(write_npz, f"{compound['folder_name']}_curves.npz")
+    def write_csv(output_buffer):
+        output_buffer.writelines(iter_csv_chunks(["Energy (eV)"] + list(curves), [energy] + list(curves.values())))
+    return dcc.send_bytes(write_csv, f"{compound['folder_name']}_curves.csv")
+
+@app.callback(
+    Output('export-cohp-dump', 'href'),
+    Output('export-cohp-dump', 'style'),
+    Output('export-coop-dump', 'href'),
+    Output('export-coop-dump', 'style'),
+    Input('uploaded-contents', 'data'),
+    State('export-cohp-dump', 'style'),
+    State('export-coop-dump', 'style'),
+    prevent_initial_call=True
+)
+def update_dump_links(data, cohp_style, coop_style):
+    links = []
+    for kind, style in (("cohp", cohp_style), ("coop", coop_style)):
+        available = bool(data and data.get(f"has_{kind}"))
+        href = app.get_relative_path(f"/export/{data['dataset_id']}/{kind}.csv") if available else ''
+        links += [href, {**style, "display": "inline" if available else "none"}]
+    return links
+
+# Per-interaction dumps bypass dcc.Download (which base64-encodes the whole payload
+# in memory) and stream straight from the cached arrays
+@app.server.route("/export/<dataset_id>/<kind>.csv")
+def export_interaction_dump(dataset_id, kind):
+    compound = get_dataset({"dataset_id": dataset_id})
+    if not compound or kind not in ("cohp", "coop") or not compound[kind]:
+        abort(404)
+    filename = f"{compound['folder_name']}_{kind.upper()}_interactions.csv"
+    response = Response(stream_with_context(iter_interaction_dump(compound[kind])), mimetype="text/csv")
+    response.headers.set("Content-Disposition", "attachment", **attachment_filename(filename))
+    return response
+
+def attachment_filename(filename):
+    # Content-Disposition options for a name taken from a user archive: quoted by
+    # werkzeug, with an ASCII fallback plus the RFC 5987 UTF-8 form when needed
+    filename = re.sub(r"[\x00-\x1f\x7f]", "_", filename)
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    if ascii_name == filename:
+        return {"filename": filename}
+    return {"filename": ascii_name, "filename*": "UTF-8''" + quote(filename, safe="")}
+
 # --- Save plot callback ---
 @app.callback(
     Output('download-plot', 'data'),
@@ -661,7 +1768,7 @@ def update_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, ymax, le
 )
 def save_plot(n_clicks, figure, folder_name):
     if n_clicks:
-        fig = pio.from_json(pio.to_json(figure))
+        fig = svg_figure(figure)
         # --- Ensure white background for saved plot ---
         fig.update_layout(
             plot_bgcolor='white',
@@ -686,7 +1793,7 @@ def save_plot(n_clicks, figure, folder_name):
 )
 def save_coop_plot(n_clicks, figure, folder_name):
     if n_clicks:
-        fig = pio.from_json(pio.to_json(figure))
+        fig = svg_figure(figure)
         # --- Ensure white background for saved plot ---
         fig.update_layout(
             plot_bgcolor='white',
@@ -724,43 +1831,39 @@ def reset_axes(n_clicks):
 # --- COOP plot callback ---
 @app.callback(
     Output('coop-plot', 'figure'),
+    Output('fermi-marker-coop', 'data'),
     Input('uploaded-contents', 'data'),
-    Input({'type': 'color-dropdown', 'index': ALL}, 'value'),
-    Input({'type': 'toggle-pair', 'index': ALL}, 'value'),
-    Input({'type': 'toggle-icohp', 'index': ALL}, 'value'),
+    Input('pair-controls', 'data'),
     Input('xmin-coop', 'value'), Input('xmax-coop', 'value'),
     Input('ymin-coop', 'value'), Input('ymax-coop', 'value'),
     Input('legend-y-coop', 'value'),
     Input('legend-x-coop', 'value'),
     Input('show-titles-coop', 'value'),
     Input('show-axis-scale-coop', 'value'),
+    Input('broadening-sigma', 'value'),
+    Input('broadening-shape', 'value'),
+    Input('orbital-channels', 'value'),
+    Input('spin-view', 'value'),
+    State('fermi-shift', 'value'),
     prevent_initial_call=True
 )
-def update_coop_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles, show_axis_scale):
-    if not data or "coop_data" not in data or not data["coop_data"]:
+def render_coop_plot(data, pair_state, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles, show_axis_scale, sigma, shape, orbital_channels, spin, fermi_shift):
+    fig = update_coop_plot(data, pair_state, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles, show_axis_scale, sigma, shape, orbital_channels, spin, fermi_shift)
+    return fig, fermi_marker_indexes(fig)
+
+def update_coop_plot(data, pair_state, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles, show_axis_scale, sigma, shape, orbital_channels, spin, fermi_shift):
+    figure = demo_figure("coop", data, (pair_state, xmin, xmax, ymin, ymax, legend_y, legend_x, show_titles,
+                                         show_axis_scale, sigma, shape, orbital_channels, spin, fermi_shift))
+    if figure is not None:
+        return figure
+    compound = get_dataset(data)
+    if not compound or not compound["coop"]:
         return go.Figure()
-    pairs = [f"{p[0]}-{p[1]}" for p in data["unique_pairs"]]
-    color_map = {pair: colors[i] if i < len(colors) else 'blue' for i, pair in enumerate(pairs)}
-    show_map = {pair: ('show' in toggles[i] if i < len(toggles) else True) for i, pair in enumerate(pairs)}
-    icohp_map = {pair: ('icohp' in icohp_toggles[i] if i < len(icohp_toggles) else False) for i, pair in enumerate(pairs)}
-    lines = data["coop_data"].splitlines()
-    header_idx = next(i for i, line in enumerate(lines) if line.strip().startswith("No.1"))
-    data_start_idx = header_idx + 1
-    numeric_lines = []
-    for line in lines[data_start_idx:]:
-        tokens = line.strip().split()
-        if tokens and re.match(r'^-?\d+\.?\d*([eE][-+]?\d+)?$', tokens[0]):
-            numeric_lines.append(line)
-    data_arr = np.genfromtxt(StringIO("\n".join(numeric_lines)))
-    energy = data_arr[:, 0]
-    interaction_to_pair = []
-    for line in lines:
-        if line.startswith("No."):
-            match = re.search(r":([A-Za-z]+)\d+->([A-Za-z]+)\d+\(", line)
-            if match:
-                atom1, atom2 = match.groups()
-                pair = (atom1, atom2) if atom1 == atom2 else tuple(sorted([atom1, atom2]))
-                interaction_to_pair.append(pair)
+    parsed = compound["coop"]
+    color_map, show_map, icohp_map = pair_state_maps(data, pair_state)
+    pcoop_mat, icoop_mat = broadened_pair_curves(compound, "coop", sigma, shape, spin)
+    trace_type = scatter_type(parsed, show_map, icohp_map, orbital_channels)
+    energy = parsed["energy"]
     # --- Dynamic x-range calculation ---
     y_min, y_max = -8, 2
     pcoop_traces = []
@@ -768,12 +1871,7 @@ def update_coop_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, yma
         pair_str = f"{pair[0]}-{pair[1]}"
         if not show_map.get(pair_str, True):
             continue
-        indices = [j for j, p in enumerate(interaction_to_pair) if p == tuple(pair)]
-        pcoop_sum = np.zeros_like(energy)
-        for idx in indices:
-            pcoop_col = 3 + 2 * idx
-            pcoop_sum += data_arr[:, pcoop_col]
-        pcoop_traces.append(pcoop_sum)
+        pcoop_traces.append(pcoop_mat[i])
     auto_xmin, auto_xmax = get_dynamic_xrange(energy, y_min, y_max, pcoop_traces)
     xmax_val = xmax if xmax is not None else auto_xmax
     xmin_val = xmin if xmin is not None else auto_xmin
@@ -784,16 +1882,9 @@ def update_coop_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, yma
         pair_str = f"{pair[0]}-{pair[1]}"
         if not show_map.get(pair_str, True):
             continue
-        indices = [j for j, p in enumerate(interaction_to_pair) if p == tuple(pair)]
-        pcoop_sum = np.zeros_like(energy)
-        icoop_sum = np.zeros_like(energy)
-        for idx in indices:
-            pcoop_col = 3 + 2 * idx
-            icoop_col = 4 + 2 * idx
-            pcoop_sum += data_arr[:, pcoop_col]
-            icoop_sum += data_arr[:, icoop_col]
+        pcoop_sum, icoop_sum = pcoop_mat[i], icoop_mat[i]
         # pCOOP line
-        fig.add_trace(go.Scatter(
+        fig.add_trace(trace_type(
             x=pcoop_sum, y=energy,
             mode='lines',
             name=pair_str,
@@ -801,13 +1892,22 @@ def update_coop_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, yma
         ))
         # ICOHP dashed line if toggled
         if icohp_map.get(pair_str, False):
-            fig.add_trace(go.Scatter(
+            fig.add_trace(trace_type(
                 x=icoop_sum, y=energy,
                 mode='lines',
                 name=f"ICOOP",
                 line=dict(width=2.25, color=color_map.get(pair_str, 'blue'), dash='dash'),
                 showlegend=True
             ))
+    # Orbital-resolved channels, dotted
+    for j, (channel, p_orbital, _) in enumerate(
+            orbital_channel_curves(parsed, orbital_channels or [], 1, sigma, shape, spin)):
+        fig.add_trace(trace_type(
+            x=p_orbital, y=energy,
+            mode='lines',
+            name=channel,
+            line=dict(width=1.75, color=ORBITAL_COLORS[j % len(ORBITAL_COLORS)], dash='dot')
+        ))
     fig.add_hline(y=0, line_dash="dash", line_color="black", line_width=2)
     fig.add_vline(x=0, line_dash="dash", line_color="black", line_width=2)
 
@@ -824,6 +1924,8 @@ def update_coop_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, yma
     folder_name = data.get('folder_name', '') if isinstance(data, dict) else ''
     folder_name_unicode = subscript_numbers(folder_name)
     zip_title = f"{folder_name_unicode} COOP"
+    if parsed["spins"] > 1 and spin in SPIN_LABELS:
+        zip_title += f" ({SPIN_LABELS[spin]})"
     plot_title = zip_title if 'plot_title' in show_titles else None
 
     # --- Axis titles ---
@@ -913,7 +2015,8 @@ def update_coop_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, yma
         fillcolor='rgba(0,0,0,0)'
     )
 
-    # --- Optional: Add Fermi level line ---
+    # --- Rigid-band Fermi level marker, moved by the E_F shift slider ---
+    add_fermi_marker(fig, fermi_shift)
 
     return fig
 
@@ -922,7 +2025,7 @@ def update_coop_plot(data, colors, toggles, icohp_toggles, xmin, xmax, ymin, yma
     Input('uploaded-contents', 'data')
 )
 def cohp_warning(data):
-    if not data or not data.get("cohp_data"):
+    if not data or not data.get("has_cohp"):
         return html.Div(
             "No COHPCAR found in ZIP.",
             style={
@@ -943,7 +2046,7 @@ def cohp_warning(data):
     Input('uploaded-contents', 'data')
 )
 def coop_warning(data):
-    if not data or not data.get("coop_data"):
+    if not data or not data.get("has_coop"):
         return html.Div(
             "No COOPCAR.lobster found in ZIP.",
             style={
@@ -968,82 +2071,60 @@ def coop_warning(data):
     prevent_initial_call=True
 )
 def set_auto_x_limits_on_upload(data):
-    if not data:
+    compound = get_dataset(data)
+    if not compound:
         raise PreventUpdate
+    y_min, y_max = -8, 2
 
     # --- COHP ---
     auto_xmin_cohp, auto_xmax_cohp = None, None
-    if data.get("cohp_data"):
-        lines = data["cohp_data"].splitlines()
-        header_idx = next(i for i, line in enumerate(lines) if line.strip().startswith("No.1"))
-        data_start_idx = header_idx + 1
-        numeric_lines = []
-        for line in lines[data_start_idx:]:
-            tokens = line.strip().split()
-            if tokens and re.match(r'^-?\d+\.?\d*([eE][-+]?\d+)?$', tokens[0]):
-                numeric_lines.append(line)
-        data_arr = np.genfromtxt(StringIO("\n".join(numeric_lines)))
-        energy = data_arr[:, 0]
-        y_min, y_max = -8, 2
+    if compound["cohp"]:
+        parsed = compound["cohp"]
         # Build pCOHP traces for all pairs
-        interaction_to_pair = []
-        for line in lines:
-            if line.startswith("No."):
-                match = re.search(r":([A-Za-z]+)\d+->([A-Za-z]+)\d+\(", line)
-                if match:
-                    atom1, atom2 = match.groups()
-                    pair = (atom1, atom2) if atom1 == atom2 else tuple(sorted([atom1, atom2]))
-                    interaction_to_pair.append(pair)
-        pcohp_traces = []
-        for i, pair in enumerate(data["unique_pairs"]):
-            indices = [j for j, p in enumerate(interaction_to_pair) if p == tuple(pair)]
-            pcohp_sum = np.zeros_like(energy)
-            for idx in indices:
-                pcohp_col = 3 + 2 * idx
-                pcohp_sum += -data_arr[:, pcohp_col]
-            pcohp_traces.append(pcohp_sum)
-        from math import floor, ceil
-        auto_xmin_cohp, auto_xmax_cohp = get_dynamic_xrange(energy, y_min, y_max, pcohp_traces)
+        pcohp_traces = broadened_pair_curves(compound, "cohp")[0]
+        auto_xmin_cohp, auto_xmax_cohp = get_dynamic_xrange(parsed["energy"], y_min, y_max, pcohp_traces)
         auto_xmin_cohp = int(round(auto_xmin_cohp))
         auto_xmax_cohp = int(round(auto_xmax_cohp))
 
     # --- COOP ---
     auto_xmin_coop, auto_xmax_coop = None, None
-    if data.get("coop_data"):
-        lines = data["coop_data"].splitlines()
-        header_idx = next(i for i, line in enumerate(lines) if line.strip().startswith("No.1"))
-        data_start_idx = header_idx + 1
-        numeric_lines = []
-        for line in lines[data_start_idx:]:
-            tokens = line.strip().split()
-            if tokens and re.match(r'^-?\d+\.?\d*([eE][-+]?\d+)?$', tokens[0]):
-                numeric_lines.append(line)
-        data_arr = np.genfromtxt(StringIO("\n".join(numeric_lines)))
-        energy = data_arr[:, 0]
-        y_min, y_max = -8, 2
+    if compound["coop"]:
+        parsed = compound["coop"]
         # Build pCOOP traces for all pairs
-        interaction_to_pair = []
-        for line in lines:
-            if line.startswith("No."):
-                match = re.search(r":([A-Za-z]+)\d+->([A-Za-z]+)\d+\(", line)
-                if match:
-                    atom1, atom2 = match.groups()
-                    pair = (atom1, atom2) if atom1 == atom2 else tuple(sorted([atom1, atom2]))
-                    interaction_to_pair.append(pair)
-        pcoop_traces = []
-        for i, pair in enumerate(data["unique_pairs"]):
-            indices = [j for j, p in enumerate(interaction_to_pair) if p == tuple(pair)]
-            pcoop_sum = np.zeros_like(energy)
-            for idx in indices:
-                pcoop_col = 3 + 2 * idx
-                pcoop_sum += data_arr[:, pcoop_col]
-            pcoop_traces.append(pcoop_sum)
-        auto_xmin_coop, auto_xmax_coop = get_dynamic_xrange(energy, y_min, y_max, pcoop_traces)
+        pcoop_traces = broadened_pair_curves(compound, "coop")[0]
+        auto_xmin_coop, auto_xmax_coop = get_dynamic_xrange(parsed["energy"], y_min, y_max, pcoop_traces)
         auto_xmin_coop = int(round(auto_xmin_coop))
         auto_xmax_coop = int(round(auto_xmax_coop))
 
     return auto_xmin_cohp, auto_xmax_cohp, auto_xmin_coop, auto_xmax_coop
 
+# --- Demo dataset: parsed and plotted once at startup ---
+def prepare_demo():
+    demo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DEMO_FILE)
+    if not os.path.exists(demo_path):
+        return
+    with zipfile.ZipFile(demo_path, 'r') as zip_ref:
+        members = next(iter(find_compounds(zip_ref.namelist()).values()), {})
+        files = {key: zip_ref.read(member) for key, member in members.items()}
+    compound = parse_compound(os.path.splitext(DEMO_FILE)[0], files)
+    PINNED_DATASETS[DEMO_DATASET_ID] = compound
+    # Replay the callback chain a demo click triggers with the layout defaults
+    data = dataset_summary(DEMO_DATASET_ID, compound)
+    pair_state = build_element_pair_table(data)
+    xmin_cohp, xmax_cohp, xmin_coop, xmax_coop = set_auto_x_limits_on_upload(data)
+    for kind, builder, xmin, xmax in (("cohp", update_plot, xmin_cohp, xmax_cohp),
+                                      ("coop", update_coop_plot, xmin_coop, xmax_coop)):
+        if compound[kind]:
+            inputs = (pair_state, xmin, xmax, DEFAULTS["ymin"], DEFAULTS["ymax"], DEFAULTS["legend_y"],
+                      DEFAULTS["legend_x"], DEFAULTS["show_titles"], DEFAULTS["show_axis_scale"],
+                      0, 'gaussian', [], 'total', 0)
+            DEMO_FIGURES[kind] = (inputs, builder(data, *inputs))
+
+clear_stale_dos_files()
+prepare_demo()
+if DATA_ROOT:
+    start_background_scan(DATA_ROOT)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8050))
     app.run_server(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
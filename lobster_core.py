@@ -0,0 +1,701 @@
+# LOBSTER parsing and aggregation, kept free of Dash/plotly so notebooks and
+# batch scripts can import it without the web stack; app.py is built on top of it
+import bz2
+import gzip
+import lzma
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack, contextmanager
+from itertools import chain, islice, repeat
+from multiprocessing import resource_tracker, shared_memory
+from io import BytesIO, TextIOWrapper
+
+CURVE_CACHE_SIZE = 8
+# Kernel half-width in units of sigma; Lorentzian tails decay slowly
+BROADENING_CUTOFF = {"gaussian": 5, "lorentzian": 50}
+# Plain files above this size are parsed in byte-range chunks across the process pool
+PARALLEL_PARSE_BYTES = 64 * 1024 * 1024
+PARSE_WORKERS = os.cpu_count() or 1
+# Parsed DOSCARs are written here as raw float64 (column, energy) blocks and memory-mapped;
+# uploaded DOSCARs are spooled here (.spool) while a pool worker parses them
+DOS_CACHE_DIR = os.path.join(tempfile.gettempdir(), "lobster-dos")
+
+_curve_cache_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        return _executor
+
+def reset_executor(executor):
+    # A worker died (e.g. killed for memory) and broke the pool: the next
+    # get_executor starts a fresh one instead of failing until a restart
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def submit_job(fn, *args):
+    # Submit to the shared pool, replacing it once if an earlier crash broke it
+    executor = get_executor()
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        reset_executor(executor)
+        return get_executor().submit(fn, *args)
+
+# --- LOBSTER parsing helpers ---
+# "No.3:Co1->Al2(2.45)" or, orbital-wise, "No.4:Co1[3d_xy]->Al2[3p_x](2.45)"
+LABEL_RE = re.compile(r":([A-Za-z]+)\d+(?:\[([^\]]+)\])?->([A-Za-z]+)\d+(?:\[([^\]]+)\])?\(")
+ORBITAL_TYPE_RE = re.compile(r"\d*([spdfg])")
+SITE_RE = re.compile(r"([A-Za-z]+)(\d+)")
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", lambda raw: gzip.GzipFile(fileobj=raw)),
+    (b"BZh", bz2.BZ2File),
+    (b"\xfd7zXZ\x00", lzma.LZMAFile),
+)
+
+@contextmanager
+def open_lobster_file(source):
+    # Text stream over a path, bytes or binary file; gzip/bz2/xz are detected by
+    # magic bytes and decompressed on the fly
+    with ExitStack() as stack:
+        if isinstance(source, (bytes, bytearray)):
+            raw = BytesIO(source)
+        elif isinstance(source, str):
+            raw = stack.enter_context(open(source, "rb"))
+        else:
+            raw = stack.enter_context(source)
+        magic = raw.read(6)
+        raw.seek(0)
+        stream = raw
+        for prefix, opener in COMPRESSION_MAGIC:
+            if magic.startswith(prefix):
+                stream = stack.enter_context(opener(raw))
+                break
+        yield stack.enter_context(TextIOWrapper(stream, encoding="utf-8"))
+
+def orbital_channel(atom1, orbital1, atom2, orbital2):
+    # "Al p – Co d": element + orbital type on each side, in element-pair order
+    sides = []
+    for atom, orbital in ((atom1, orbital1), (atom2, orbital2)):
+        match = ORBITAL_TYPE_RE.match(orbital or "")
+        sides.append(f"{atom} {match.group(1) if match else orbital}")
+    return " – ".join(sorted(sides))
+
+def parse_lobster_header(stream):
+    # Column index from the No.N label lines: the k-th label owns column 3 + 2k
+    # (population) and 4 + 2k (integrated) of spin up; spin down repeats the
+    # average + label columns spin_stride columns further right.
+    # Returns the first numeric line too.
+    line = stream.readline()
+    lines_read = 1
+    n_points = None
+    spins, spin_stride = 1, 0
+    while line and not line.strip().startswith("No.1"):
+        line = stream.readline()
+        lines_read += 1
+        # Second line: "<interactions + 1> <spins> <energy points> <Emin> <Emax> <E_F>"
+        if lines_read == 2 and len(line.split()) >= 3:
+            fields = line.split()
+            n_points = int(fields[2])
+            spins, spin_stride = int(fields[1]), 2 * int(fields[0])
+    interaction_to_pair = []
+    interaction_columns = []
+    labels = []
+    orbital_columns = {}
+    k = 0
+    while line.startswith("No."):
+        match = LABEL_RE.search(line)
+        if match:
+            atom1, orbital1, atom2, orbital2 = match.groups()
+            if orbital1 or orbital2:
+                orbital_columns.setdefault(orbital_channel(atom1, orbital1, atom2, orbital2), []).append(3 + 2 * k)
+            else:
+                interaction_to_pair.append((atom1, atom2) if atom1 == atom2 else tuple(sorted([atom1, atom2])))
+                interaction_columns.append(3 + 2 * k)
+                labels.append(line.strip())
+        k += 1
+        line = stream.readline()
+        lines_read += 1
+    return {
+        "header_lines": lines_read - 1,
+        "n_points": n_points,
+        "spins": spins,
+        "spin_stride": spin_stride,
+        "interaction_to_pair": interaction_to_pair,
+        "interaction_columns": interaction_columns,
+        "labels": labels,
+        "orbital_columns": orbital_columns,
+    }, line
+
+def parallel_parse_eligible(source):
+    # Only big, uncompressed files on disk, and never from inside a pool worker
+    if not isinstance(source, str) or PARSE_WORKERS < 2 or multiprocessing.parent_process() is not None:
+        return False
+    if os.path.getsize(source) < PARALLEL_PARSE_BYTES:
+        return False
+    with open(source, "rb") as f:
+        magic = f.read(6)
+    return not any(magic.startswith(prefix) for prefix, _ in COMPRESSION_MAGIC)
+
+def chunk_ranges(path, start, end, n_chunks):
+    # Split [start, end) into byte ranges that each begin at a line start
+    bounds = [start]
+    with open(path, "rb") as f:
+        for i in range(1, n_chunks):
+            f.seek(max(bounds[-1], start + (end - start) * i // n_chunks))
+            f.readline()
+            if bounds[-1] < f.tell() < end:
+                bounds.append(f.tell())
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def count_chunk_rows(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return data.count(b"\n") + (0 if data.endswith(b"\n") else 1)
+
+def parse_chunk_into(path, start, end, usecols, shm_name, shape, row_start, rows):
+    # Runs in a worker process: parse one byte range into its rows of the shared block
+    with open(path, "rb") as f:
+        f.seek(start)
+        block = np.loadtxt(BytesIO(f.read(end - start)), usecols=usecols, ndmin=2, unpack=True)
+    if block.shape[1] != rows:
+        raise ValueError(f"expected {rows} rows in bytes {start}-{end}, got {block.shape[1]}")
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # The parent owns the segment; stop this process's tracker from unlinking it at exit
+    resource_tracker.unregister(shm._name, "shared_memory")
+    try:
+        out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        out[:, row_start:row_start + rows] = block
+        del out
+    finally:
+        shm.close()
+
+def parse_block_parallel(parsed, usecols):
+    # Split the numeric block at line boundaries and parse the chunks across the
+    # process pool into one shared (column, energy) array sized from the header.
+    # The array stays backed by the shared segment (no second copy); the segment
+    # is kept on parsed and released by release_shared_memory.
+    path = parsed["source"]
+    with open(path, "rb") as f:
+        for _ in range(parsed["header_lines"]):
+            f.readline()
+        start = f.tell()
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(start, size - 4096))
+        tail = f.read()
+    end = size - (len(tail) - len(tail.rstrip()))
+    ranges = chunk_ranges(path, start, end, PARSE_WORKERS * 2)
+    executor = get_executor()
+    try:
+        rows = list(executor.map(count_chunk_rows, repeat(path), *zip(*ranges)))
+        if parsed["n_points"] is None or sum(rows) != parsed["n_points"]:
+            return None
+        shape = (len(usecols), parsed["n_points"])
+        shm = shared_memory.SharedMemory(create=True, size=max(1, 8 * shape[0] * shape[1]))
+        try:
+            row_starts = np.cumsum([0] + rows[:-1]).tolist()
+            futures = [
+                executor.submit(parse_chunk_into, path, chunk_start, chunk_end, usecols, shm.name, shape, row_start, n)
+                for (chunk_start, chunk_end), row_start, n in zip(ranges, row_starts, rows)
+            ]
+            for future in futures:
+                future.result()
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        parsed.setdefault("shared_memory", []).append(shm)
+        return np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    except BrokenProcessPool:
+        # Fall back to the streamed single pass; the next parallel parse gets a fresh pool
+        reset_executor(executor)
+        return None
+
+def read_numeric_columns(parsed, usecols):
+    # (len(usecols), energy) block, in parallel for big plain files, else one streamed pass
+    if parallel_parse_eligible(parsed["source"]):
+        block = parse_block_parallel(parsed, usecols)
+        if block is not None:
+            return block
+    with open_lobster_file(parsed["source"]) as stream:
+        return np.loadtxt(stream, skiprows=parsed["header_lines"], usecols=usecols, ndmin=2, unpack=True)
+
+def load_columns(parsed, columns):
+    # (energy, len(columns)) block; whole-bond columns come from the spin block, the
+    # rest are loaded in one pass on first use and cached
+    cache = parsed["column_cache"]
+    block_columns = parsed["block_columns"]
+    missing = sorted(set(columns) - cache.keys() - block_columns.keys())
+    if missing:
+        cache.update(zip(missing, read_numeric_columns(parsed, missing)))
+    if not columns:
+        return np.empty((len(parsed["energy"]), 0))
+    spin_block = parsed["spin_block"]
+    return np.column_stack([spin_block[block_columns[col]] if col in block_columns else cache[col]
+                            for col in columns])
+
+def parse_lobster_source(source):
+    # Header, then only energy and the whole-bond columns: streamed on from the same
+    # pass for small or compressed files, chunked across the pool for big ones.
+    # Orbital-resolved columns stay on disk until load_columns asks for them.
+    # Every spin channel lands in the same pass, ordered (spin, population/integrated,
+    # interaction) so spin_block is a reshape of the parsed block, not a copy.
+    with open_lobster_file(source) as stream:
+        parsed, line = parse_lobster_header(stream)
+        parsed["source"] = source
+        parsed["column_cache"] = {}
+        parsed["block_columns"] = {}
+        block_index = [(spin, j, k) for spin in range(parsed["spins"]) for j in (0, 1)
+                       for k in range(len(parsed["interaction_columns"]))]
+        eager = [0] + [parsed["interaction_columns"][k] + j + spin * parsed["spin_stride"]
+                       for spin, j, k in block_index]
+        if not parallel_parse_eligible(source):
+            block = np.loadtxt(chain([line], stream), usecols=eager, ndmin=2, unpack=True)
+    if parallel_parse_eligible(source):
+        block = read_numeric_columns(parsed, eager)
+    parsed["energy"] = parsed["column_cache"][0] = block[0]
+    parsed["spin_block"] = block[1:].reshape(parsed["spins"], 2, len(parsed["interaction_columns"]), block.shape[1])
+    parsed["block_columns"] = dict(zip(eager[1:], block_index))
+    return parsed
+
+def parse_bond_list(lines):
+    # ICOHPLIST/ICOOPLIST: one line per bond, spin channels summed
+    rows = {}
+    for line in lines:
+        tokens = line.split()
+        if len(tokens) < 5 or not tokens[0].isdigit() or "[" in tokens[1]:
+            continue
+        if len(tokens) >= 8:
+            translation = " ".join(tokens[4:7])
+            value = float(tokens[7])
+        else:
+            translation = ""
+            value = float(tokens[4])
+        bond = int(tokens[0])
+        if bond in rows:
+            rows[bond][4] += value
+        else:
+            rows[bond] = [tokens[1], tokens[2], float(tokens[3]), translation, value]
+    return rows
+
+def build_bond_table(icohp_rows, icoop_rows):
+    # Columnar bond table with an argsort index per column, so paging never re-sorts
+    base_rows = icohp_rows or icoop_rows
+    if not base_rows:
+        return None
+    bonds = sorted(base_rows)
+    columns = {
+        "bond": np.array(bonds),
+        "atom1": np.array([base_rows[b][0] for b in bonds]),
+        "atom2": np.array([base_rows[b][1] for b in bonds]),
+        "distance": np.array([base_rows[b][2] for b in bonds]),
+        "translation": np.array([base_rows[b][3] for b in bonds]),
+        "icohp": np.array([icohp_rows[b][4] if b in icohp_rows else np.nan for b in bonds]),
+        "icoop": np.array([icoop_rows[b][4] if b in icoop_rows else np.nan for b in bonds]),
+    }
+    return {
+        "columns": columns,
+        "sorted": {name: np.argsort(col, kind='stable') for name, col in columns.items()},
+    }
+
+# --- Pair grouping and curve math ---
+def pair_membership(parsed, pairs):
+    # (pair, interaction) 0/1 matrix: which interactions sum into each element pair
+    interaction_to_pair = parsed["interaction_to_pair"]
+    membership = np.array([[p == tuple(pair) for p in interaction_to_pair] for pair in pairs], dtype=float)
+    return membership.reshape(len(pairs), len(interaction_to_pair))
+
+SPIN_VIEWS = ("total", "up", "down")
+
+def spin_range(parsed, spin="total"):
+    # Spin channels summed into a view; spin-unpolarized files only have "up"
+    if parsed["spins"] == 1 or spin == "up":
+        return slice(0, 1)
+    if spin == "down":
+        return slice(1, 2)
+    return slice(0, parsed["spins"])
+
+def spin_curves(parsed, j, spin="total"):
+    # (interaction, energy) populations (j = 0) or integrated values (j = 1) of one
+    # spin view: a view of the spin block, summed over spins only for total
+    selected = parsed["spin_block"][spin_range(parsed, spin), j]
+    return selected[0] if selected.shape[0] == 1 else selected.sum(axis=0)
+
+def spin_columns(parsed, columns, spin="total"):
+    # load_columns summed over the spin channels of a view
+    spins = spin_range(parsed, spin)
+    return sum(load_columns(parsed, [col + s * parsed["spin_stride"] for col in columns])
+               for s in range(spins.start, spins.stop))
+
+def pair_curve_matrix(parsed, pairs, sign=1, spin="total"):
+    # (pair, energy) matrices of summed population / integrated columns, one matmul
+    # per spin channel straight on the spin block
+    membership = pair_membership(parsed, pairs)
+    selected = parsed["spin_block"][spin_range(parsed, spin)]
+    p_mat = sign * sum(membership @ block[0] for block in selected)
+    i_mat = sign * sum(membership @ block[1] for block in selected)
+    return p_mat, i_mat
+
+def value_at_energy(energy, curves, e):
+    # Linear interpolation of every row of curves at one energy
+    i = int(np.clip(np.searchsorted(energy, e), 1, len(energy) - 1))
+    w = float(np.clip((e - energy[i - 1]) / (energy[i] - energy[i - 1]), 0, 1))
+    return curves[:, i - 1] * (1 - w) + curves[:, i] * w
+
+def trapezoid_weights(energy, e):
+    # Weights t such that t @ curve is the running trapezoid integral of curve
+    # (from energy[0]) interpolated at e, as value_at_energy reads integrate_matrix
+    i = int(np.clip(np.searchsorted(energy, e), 1, len(energy) - 1))
+    w = float(np.clip((e - energy[i - 1]) / (energy[i] - energy[i - 1]), 0, 1))
+    half_steps = 0.5 * np.diff(energy)
+    weights = np.zeros(len(energy))
+    weights[:i - 1] += half_steps[:i - 1]
+    weights[1:i] += half_steps[:i - 1]
+    weights[i - 1:i + 1] += w * half_steps[i - 1]
+    return weights
+
+def interaction_integrals_at(parsed, e, spin="total", sigma=0, shape='gaussian'):
+    # Running integral of every interaction at e, as re-integrating the broadened
+    # populations would give it: the kernel is symmetric, so broadening the
+    # integration weights instead of the curves leaves one matrix-vector product
+    energy = parsed["energy"]
+    selected = parsed["spin_block"][spin_range(parsed, spin)]
+    sigma = round(float(sigma or 0), 4)
+    if sigma <= 0:
+        # LOBSTER's own integrated columns, identical to the bond table
+        return sum(value_at_energy(energy, block[1], e) for block in selected)
+    weights = broaden_matrix(energy, trapezoid_weights(energy, e)[None, :], sigma, shape)[0]
+    return sum(block[1][:, 0] + block[0] @ weights for block in selected)
+
+def rigid_band_integrals(compound, kind, e, spin="total", sigma=0, shape='gaussian', view="pairs"):
+    # Integrated population up to energy e per element pair (or per interaction),
+    # matching the (broadened) running integrals the plots draw
+    parsed = compound[kind]
+    if view == "interactions":
+        if len(parsed["energy"]) < 2:
+            return np.zeros(len(parsed["interaction_columns"]))
+        return interaction_integrals_at(parsed, e, spin, sigma, shape)
+    if len(parsed["energy"]) < 2:
+        return np.zeros(len(compound["unique_pairs"]))
+    sign = -1 if kind == "cohp" else 1
+    return sign * value_at_energy(parsed["energy"], broadened_pair_curves(compound, kind, sigma, shape, spin)[1], e)
+
+def rank_pair_interactions(parsed, pair, sign=1, top_n=10, spin="total"):
+    # Member interactions of one pair, strongest sign * integrated value at E_F (0 eV) first
+    members = [k for k, p in enumerate(parsed["interaction_to_pair"]) if p == tuple(pair)]
+    if not members or len(parsed["energy"]) < 2:
+        return [], np.empty(0)
+    integrated = spin_curves(parsed, 1, spin)[members]
+    at_fermi = sign * value_at_energy(parsed["energy"], integrated, 0.0)
+    order = np.argsort(-at_fermi, kind='stable')[:top_n]
+    return [members[j] for j in order], at_fermi[order]
+
+def orbital_channel_curves(parsed, channels, sign=1, sigma=0, shape='gaussian', spin="total"):
+    # Summed orbital-resolved curves per channel, read lazily from the source file
+    channels = [c for c in channels if c in parsed["orbital_columns"]]
+    if not channels:
+        return []
+    spins = spin_range(parsed, spin)
+    wanted = [col for c in channels for col in parsed["orbital_columns"][c]]
+    load_columns(parsed, [col + j + s * parsed["spin_stride"] for col in wanted for j in (0, 1)
+                          for s in range(spins.start, spins.stop)])
+    energy = parsed["energy"]
+    p_mat = sign * np.array([spin_columns(parsed, parsed["orbital_columns"][c], spin).sum(axis=1)
+                             for c in channels])
+    i_mat = sign * np.array([spin_columns(parsed, [col + 1 for col in parsed["orbital_columns"][c]], spin).sum(axis=1)
+                             for c in channels])
+    if sigma and len(energy) > 1:
+        p_mat = broaden_matrix(energy, p_mat, sigma, shape)
+        i_mat = integrate_matrix(energy, p_mat, i_mat[:, 0])
+    return list(zip(channels, p_mat, i_mat))
+
+def broaden_matrix(energy, curves, sigma, shape):
+    # Convolve every row with a unit-area kernel in one batched FFT
+    de = (energy[-1] - energy[0]) / (len(energy) - 1)
+    half_width = min(len(energy) - 1, int(np.ceil(BROADENING_CUTOFF[shape] * sigma / de)))
+    x = np.arange(-half_width, half_width + 1) * de
+    if shape == 'lorentzian':
+        kernel = sigma / np.pi / (x ** 2 + sigma ** 2)
+    else:
+        kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    kernel /= kernel.sum()
+    n_fft = 1 << (curves.shape[1] + kernel.size - 2).bit_length()
+    spectrum = np.fft.rfft(curves, n_fft, axis=1) * np.fft.rfft(kernel, n_fft)
+    return np.fft.irfft(spectrum, n_fft, axis=1)[:, half_width:half_width + curves.shape[1]]
+
+def integrate_matrix(energy, curves, start):
+    # Cumulative trapezoid along energy, offset by the integral below the window
+    steps = 0.5 * (curves[:, 1:] + curves[:, :-1]) * np.diff(energy)
+    return np.concatenate([start[:, None], start[:, None] + np.cumsum(steps, axis=1)], axis=1)
+
+def broadened_pair_curves(compound, kind, sigma=0, shape='gaussian', spin="total"):
+    # Pair matrices of one dataset, cached per (kind, sigma, shape, spin view)
+    sigma = round(float(sigma or 0), 4)
+    spin = spin if compound[kind]["spins"] > 1 else "up"
+    key = (kind, sigma, shape if sigma else None, spin)
+    with _curve_cache_lock:
+        cache = compound.setdefault("curve_cache", OrderedDict())
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    parsed = compound[kind]
+    sign = -1 if kind == "cohp" else 1
+    p_mat, i_mat = pair_curve_matrix(parsed, compound["unique_pairs"], sign, spin)
+    if sigma > 0 and len(parsed["energy"]) > 1:
+        p_mat = broaden_matrix(parsed["energy"], p_mat, sigma, shape)
+        i_mat = integrate_matrix(parsed["energy"], p_mat, i_mat[:, 0])
+    with _curve_cache_lock:
+        cache[key] = (p_mat, i_mat)
+        while len(cache) > CURVE_CACHE_SIZE:
+            cache.popitem(last=False)
+    return p_mat, i_mat
+
+# --- DOSCAR.lobster: projected DOS memory-mapped from disk ---
+def read_dos_block(stream, n_points):
+    # Next n_points rows of the stream as a (column, energy) block, never reading past them
+    block = np.loadtxt(islice(stream, n_points), ndmin=2, unpack=True)
+    if block.shape[1] != n_points:
+        raise ValueError(f"DOSCAR block has {block.shape[1]} rows, header says {n_points}")
+    return block
+
+def parse_doscar(stream):
+    # Total DOS, then one block per site: each block is written to a file as soon as it
+    # is read, so only one site's columns are ever in memory. Spin channels of an
+    # orbital sit next to each other, as in VASP's lm-decomposed DOSCAR.
+    header = [stream.readline() for _ in range(6)]
+    n_sites = int(header[0].split()[0])
+    fields = header[5].split(";")[0].split()
+    n_points = int(fields[2])
+    os.makedirs(DOS_CACHE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{dos_owner_pid()}-", suffix=".f64", dir=DOS_CACHE_DIR)
+    sites = []
+    try:
+        with os.fdopen(fd, "wb") as out:
+            total = read_dos_block(stream, n_points)
+            spins = max(1, (total.shape[0] - 1) // 2)
+            total[1:1 + spins].tofile(out)
+            n_columns = spins
+            for site in range(1, n_sites + 1):
+                line = stream.readline()
+                if not line.strip():
+                    break
+                orbitals = line.split(";")[-1].split() if ";" in line else []
+                z = re.search(r"Z=\s*(\d+)", line)
+                block = read_dos_block(stream, n_points)[1:]
+                orbitals = orbitals or [f"orbital{i + 1}" for i in range(block.shape[0] // spins)]
+                sites.append({
+                    "site": site,
+                    "z": int(z.group(1)) if z else None,
+                    "orbital_columns": {
+                        orbital: list(range(n_columns + i * spins, n_columns + (i + 1) * spins))
+                        for i, orbital in enumerate(orbitals)
+                    },
+                })
+                block.tofile(out)
+                n_columns += block.shape[0]
+    except Exception:
+        os.remove(path)
+        raise
+    return {
+        "path": path,
+        "shape": (n_columns, n_points),
+        # Like COHPCAR, energies are already shifted so that E_F = 0
+        "energy": total[0],
+        "spins": spins,
+        "total_columns": list(range(spins)),
+        "sites": sites,
+    }
+
+def dos_matrix(dos):
+    # Read-only view of the whole (column, energy) file; rows are paged in on access
+    return np.memmap(dos["path"], dtype=np.float64, mode="r", shape=dos["shape"])
+
+def site_elements(parsed):
+    # Site number -> element, read off the COHPCAR/COOPCAR labels ("Al1->Co11")
+    elements = {}
+    for label in parsed["labels"] if parsed else []:
+        for element, site in SITE_RE.findall(label.split(":", 1)[-1].split("(")[0]):
+            elements[int(site)] = element
+    return elements
+
+def dos_projections(dos, elements):
+    # Selectable projections -> DOS columns summed into them: total, per element and
+    # per element orbital type; spin channels are summed
+    projections = {"Total": dos["total_columns"]}
+    for site in dos["sites"]:
+        element = elements.get(site["site"]) or f"Z={site['z']}"
+        for orbital, columns in site["orbital_columns"].items():
+            match = ORBITAL_TYPE_RE.match(orbital)
+            projections.setdefault(element, []).extend(columns)
+            projections.setdefault(f"{element} {match.group(1) if match else orbital}", []).extend(columns)
+    return projections
+
+def dos_curves(dos, names):
+    # (projection, energy) curves of only the requested projections
+    matrix = dos_matrix(dos)
+    curves = np.array([matrix[sorted(dos["projections"][name])].sum(axis=0) for name in names])
+    del matrix
+    return curves.reshape(len(names), dos["shape"][1])
+
+def release_shared_memory(parsed):
+    # Unlink the shared segments behind a parallel-parsed block; the mapping itself
+    # goes away once no array views it any more
+    segments = parsed.pop("shared_memory", [])
+    parsed["column_cache"].clear()
+    parsed["spin_block"] = parsed["energy"] = None
+    for shm in segments:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            shm.close()
+        except BufferError:
+            # Still viewed by a caller holding the arrays
+            pass
+
+def dos_owner_pid():
+    # The server process a DOS file belongs to, also when a pool worker writes it
+    return (multiprocessing.parent_process() or multiprocessing.current_process()).pid
+
+def spool_to_disk(stream):
+    # Copy a (zip member) stream to a temp file, so a pool worker gets a path
+    # instead of the whole file pickled through the pool
+    os.makedirs(DOS_CACHE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{dos_owner_pid()}-", suffix=".spool", dir=DOS_CACHE_DIR)
+    with os.fdopen(fd, "wb") as out, stream:
+        shutil.copyfileobj(stream, out, 1 << 20)
+    return path
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def clear_stale_dos_files():
+    # Remove DOS and spool files left behind by server processes that are gone (crash, restart).
+    # Run at startup, before this process wrote any: files carrying our own pid are
+    # from an earlier process that had the same pid (e.g. pid 1 in a container).
+    try:
+        names = os.listdir(DOS_CACHE_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith((".f64", ".spool")):
+            continue
+        owner = name.split("-", 1)[0]
+        if owner.isdigit() and int(owner) != os.getpid():
+            try:
+                os.kill(int(owner), 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                # Alive, owned by another user
+                continue
+        try:
+            os.remove(os.path.join(DOS_CACHE_DIR, name))
+        except OSError:
+            pass
+
+def discard_compound(compound):
+    # Drop the on-disk DOS and the shared parse buffers of a compound that left the cache
+    for kind in ("cohp", "coop"):
+        if compound and compound.get(kind) and compound[kind].get("shared_memory"):
+            release_shared_memory(compound[kind])
+    dos = compound.get("dos") if compound else None
+    if dos:
+        try:
+            os.remove(dos["path"])
+        except FileNotFoundError:
+            pass
+
+def parse_source(files, key, parser, default=None):
+    if not files.get(key):
+        return default
+    with open_lobster_file(files[key]) as stream:
+        return parser(stream)
+
+def parse_compound(folder_name, files):
+    # files maps LOBSTER_FILES keys to paths or bytes, kept for lazy column loads.
+    # Runs in a worker process: everything returned must be picklable
+    cohp = parse_lobster_source(files["cohp"]) if files.get("cohp") else None
+    coop = parse_lobster_source(files["coop"]) if files.get("coop") else None
+    icohp_rows = parse_source(files, "icohplist", parse_bond_list, {})
+    icoop_rows = parse_source(files, "icooplist", parse_bond_list, {})
+    dos = parse_source(files, "doscar", parse_doscar)
+    unique_pairs = set()
+    for parsed in [cohp, coop]:
+        if parsed:
+            unique_pairs.update(parsed["interaction_to_pair"])
+    if dos:
+        reference = cohp or coop
+        dos["projections"] = dos_projections(dos, site_elements(reference))
+        # LOBSTER writes DOSCAR on the COHPCAR grid: share that energy axis so row i
+        # is the same energy in every panel
+        if (reference and reference["energy"].shape == dos["energy"].shape
+                and np.allclose(dos["energy"], reference["energy"], atol=1e-4)):
+            dos["energy"] = reference["energy"]
+    return {
+        "folder_name": folder_name,
+        "cohp": cohp,
+        "coop": coop,
+        "bonds": build_bond_table(icohp_rows, icoop_rows),
+        "unique_pairs": sorted(unique_pairs),
+        "dos": dos,
+    }
+
+LOBSTER_FILES = (
+    ("cohp", "COHPCAR"),
+    ("coop", "COOPCAR"),
+    ("icohplist", "ICOHPLIST"),
+    ("icooplist", "ICOOPLIST"),
+    ("doscar", "DOSCAR"),
+)
+
+def find_compounds(files):
+    # Group LOBSTER outputs of an archive by the folder that holds them
+    compounds = {}
+    for f in files:
+        base = os.path.basename(f)
+        if f.startswith("__MACOSX/") or base.startswith("._"):
+            continue
+        for key, tag in LOBSTER_FILES:
+            if tag in base:
+                compounds.setdefault(os.path.dirname(f), {}).setdefault(key, f)
+    return {folder: members for folder, members in compounds.items()
+            if "cohp" in members or "coop" in members}
+
+# --- Auto x-range of the plots ---
+def get_dynamic_xrange(energy, y_min, y_max, traces):
+    # traces: list of np.arrays, each is a pCOHP or pCOOP sum
+    mask = (energy >= y_min) & (energy <= y_max)
+    max_abs = 0
+    for arr in traces:
+        if arr is not None and arr.shape == energy.shape:
+            arr_in_window = arr[mask]
+            if arr_in_window.size > 0:
+                max_abs = max(max_abs, np.max(np.abs(arr_in_window)))
+    if max_abs == 0:
+        max_abs = 1  # fallback to avoid zero width
+    buffer = max_abs * 0.05
+    return -max_abs - buffer, max_abs + buffer
@@ -0,0 +1,221 @@
+import bz2
+import gzip
+import lzma
+import os
+
+import numpy as np
+import pytest
+
+import lobster_core
+
+# --- Synthetic LOBSTER outputs: every column holds its own index, so a value
+# read back tells which file column it came from ---
+N_POINTS = 40
+# 0.25 eV steps print exactly, so parsed energies compare equal
+ENERGY = -5 + 0.25 * np.arange(N_POINTS)
+
+def column_values(n_columns):
+    # (energy, column) table: energy in column 0, 1000 * column + row elsewhere
+    rows = np.arange(N_POINTS)
+    table = 1000.0 * np.arange(n_columns)[None, :] + rows[:, None]
+    table[:, 0] = ENERGY
+    return table
+
+def write_cohpcar(path, labels, spins=1):
+    n_columns = 1 + 2 * (len(labels) + 1) * spins
+    table = column_values(n_columns)
+    lines = [
+        "COHPCAR.lobster synthetic",
+        f"{len(labels) + 1} {spins} {N_POINTS} {ENERGY[0]} {ENERGY[-1]} 0.0",
+        "Average",
+    ]
+    lines += [f"No.{k + 1}:{label}" for k, label in enumerate(labels)]
+    lines += [" ".join(f"{value:.6f}" for value in row) for row in table]
+    path.write_text("\n".join(lines) + "\n")
+    return table
+
+def write_doscar(path, sites, spins=1):
+    # sites: list of (Z, orbital names)
+    energy = ENERGY
+    total = np.column_stack([energy] + [energy * 0 + 10 + s for s in range(2 * spins)])
+    lines = [f"{len(sites)} {len(sites)} 1 0", "0.1 0.1 0.1 0.1 0.1", "1e-16", "CAR", "LOBSTER",
+             f"{ENERGY[-1]} {ENERGY[0]} {N_POINTS} 0.0 1.0"]
+    lines += [" ".join(f"{value:.6f}" for value in row) for row in total]
+    blocks = []
+    for site, (z, orbitals) in enumerate(sites):
+        values = np.array([[100.0 * site + 10 * i + s for i in range(len(orbitals)) for s in range(spins)]] * N_POINTS)
+        blocks.append(values)
+        lines.append(f"{ENERGY[-1]} {ENERGY[0]} {N_POINTS} 0.0 1.0; Z= {z}; {' '.join(orbitals)}")
+        lines += [" ".join(f"{value:.6f}" for value in [e, *row]) for e, row in zip(energy, values)]
+    path.write_text("\n".join(lines) + "\n")
+    return energy, blocks
+
+LABELS = ["Co1->Al2(2.45)", "Al2->Al3(2.80)", "Al3->Co1(2.50)"]
+ORBITAL_LABELS = [
+    "Co1->Al2(2.45)",
+    "Co1[4s]->Al2[3s](2.45)",
+    "Co1[3d_xy]->Al2[3p_x](2.45)",
+    "Al2->Al3(2.80)",
+    "Al2[3s]->Al3[3p_x](2.80)",
+    "Al2[3p_x]->Al3[3s](2.80)",
+]
+
+@pytest.fixture(autouse=True)
+def dos_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(lobster_core, "DOS_CACHE_DIR", str(tmp_path / "dos"))
+
+# --- COHPCAR column index ---
+def test_header_column_index(tmp_path):
+    write_cohpcar(tmp_path / "COHPCAR.lobster", LABELS)
+    parsed = lobster_core.parse_lobster_source(str(tmp_path / "COHPCAR.lobster"))
+    assert parsed["n_points"] == N_POINTS
+    assert parsed["spins"] == 1
+    assert parsed["interaction_columns"] == [3, 5, 7]
+    assert parsed["interaction_to_pair"] == [("Al", "Co"), ("Al", "Al"), ("Al", "Co")]
+    assert parsed["orbital_columns"] == {}
+
+def test_spin_unpolarized_block(tmp_path):
+    table = write_cohpcar(tmp_path / "COHPCAR.lobster", LABELS)
+    parsed = lobster_core.parse_lobster_source(str(tmp_path / "COHPCAR.lobster"))
+    np.testing.assert_allclose(parsed["energy"], table[:, 0])
+    assert parsed["spin_block"].shape == (1, 2, 3, N_POINTS)
+    for k, col in enumerate(parsed["interaction_columns"]):
+        np.testing.assert_allclose(parsed["spin_block"][0, 0, k], table[:, col])
+        np.testing.assert_allclose(parsed["spin_block"][0, 1, k], table[:, col + 1])
+    # Every spin view of an unpolarized file is the single channel
+    for spin in lobster_core.SPIN_VIEWS:
+        np.testing.assert_allclose(lobster_core.spin_curves(parsed, 0, spin), parsed["spin_block"][0, 0])
+
+def test_spin_polarized_stride(tmp_path):
+    table = write_cohpcar(tmp_path / "COHPCAR.lobster", LABELS, spins=2)
+    parsed = lobster_core.parse_lobster_source(str(tmp_path / "COHPCAR.lobster"))
+    assert parsed["spins"] == 2
+    assert parsed["spin_stride"] == 8
+    stride = parsed["spin_stride"]
+    for k, col in enumerate(parsed["interaction_columns"]):
+        np.testing.assert_allclose(parsed["spin_block"][0, 0, k], table[:, col])
+        np.testing.assert_allclose(parsed["spin_block"][1, 0, k], table[:, col + stride])
+        np.testing.assert_allclose(parsed["spin_block"][1, 1, k], table[:, col + 1 + stride])
+    up = lobster_core.spin_curves(parsed, 0, "up")
+    down = lobster_core.spin_curves(parsed, 0, "down")
+    np.testing.assert_allclose(lobster_core.spin_curves(parsed, 0, "total"), up + down)
+    pairs = [("Al", "Al"), ("Al", "Co")]
+    p_mat, i_mat = lobster_core.pair_curve_matrix(parsed, pairs, -1, "down")
+    np.testing.assert_allclose(p_mat[1], -(down[0] + down[2]))
+    # A column outside the spin block is loaded lazily from the file
+    np.testing.assert_allclose(lobster_core.load_columns(parsed, [1 + stride])[:, 0], table[:, 1 + stride])
+
+# --- Orbital-wise COHPCAR ---
+def test_orbital_channels(tmp_path):
+    table = write_cohpcar(tmp_path / "COHPCAR.lobster", ORBITAL_LABELS)
+    parsed = lobster_core.parse_lobster_source(str(tmp_path / "COHPCAR.lobster"))
+    assert parsed["interaction_columns"] == [3, 9]
+    assert parsed["orbital_columns"] == {
+        "Al s – Co s": [5],
+        "Al p – Co d": [7],
+        # Mirrored same-element channels merge into one
+        "Al p – Al s": [11, 13],
+    }
+    # Orbital columns are not read until a channel is asked for
+    assert set(parsed["column_cache"]) == {0}
+    (channel, p_curve, i_curve), = lobster_core.orbital_channel_curves(parsed, ["Al p – Al s"], sign=-1)
+    assert channel == "Al p – Al s"
+    np.testing.assert_allclose(p_curve, -(table[:, 11] + table[:, 13]))
+    np.testing.assert_allclose(i_curve, -(table[:, 12] + table[:, 14]))
+
+def test_orbital_channel_name():
+    assert lobster_core.orbital_channel("Co", "3d_xy", "Al", "3p_x") == "Al p – Co d"
+    assert lobster_core.orbital_channel("Al", "3s", "Al", "3p_x") == lobster_core.orbital_channel("Al", "3p_x", "Al", "3s")
+
+# --- Compressed inputs ---
+@pytest.mark.parametrize("suffix, compress", [
+    (".gz", gzip.compress),
+    (".bz2", bz2.compress),
+    (".xz", lzma.compress),
+])
+def test_compressed_sources(tmp_path, suffix, compress):
+    table = write_cohpcar(tmp_path / "COHPCAR.lobster", ORBITAL_LABELS, spins=2)
+    raw = (tmp_path / "COHPCAR.lobster").read_bytes()
+    compressed = tmp_path / f"COHPCAR.lobster{suffix}"
+    compressed.write_bytes(compress(raw))
+    plain = lobster_core.parse_lobster_source(str(tmp_path / "COHPCAR.lobster"))
+    for source in (str(compressed), compress(raw)):
+        parsed = lobster_core.parse_lobster_source(source)
+        assert parsed["orbital_columns"] == plain["orbital_columns"]
+        np.testing.assert_allclose(parsed["spin_block"], plain["spin_block"])
+        np.testing.assert_allclose(lobster_core.load_columns(parsed, [13])[:, 0], table[:, 13])
+
+# --- Chunked parallel parse ---
+def test_parallel_parse_matches_streamed(tmp_path, monkeypatch):
+    table = write_cohpcar(tmp_path / "COHPCAR.lobster", ORBITAL_LABELS, spins=2)
+    path = str(tmp_path / "COHPCAR.lobster")
+    streamed = lobster_core.parse_lobster_source(path)
+    monkeypatch.setattr(lobster_core, "PARALLEL_PARSE_BYTES", 1)
+    monkeypatch.setattr(lobster_core, "PARSE_WORKERS", 2)
+    try:
+        parsed = lobster_core.parse_lobster_source(path)
+        assert parsed.get("shared_memory")
+        np.testing.assert_array_equal(parsed["energy"], streamed["energy"])
+        np.testing.assert_array_equal(parsed["spin_block"], streamed["spin_block"])
+        np.testing.assert_allclose(lobster_core.load_columns(parsed, [11])[:, 0], table[:, 11])
+        names = [shm.name for shm in parsed["shared_memory"]]
+        lobster_core.discard_compound({"cohp": parsed, "coop": None})
+        assert not any(os.path.exists(f"/dev/shm/{name}") for name in names)
+    finally:
+        executor = lobster_core._executor
+        if executor is not None:
+            lobster_core.reset_executor(executor)
+
+def test_parallel_parse_falls_back_on_row_mismatch(tmp_path, monkeypatch):
+    write_cohpcar(tmp_path / "COHPCAR.lobster", LABELS)
+    path = str(tmp_path / "COHPCAR.lobster")
+    streamed = lobster_core.parse_lobster_source(path)
+    monkeypatch.setattr(lobster_core, "PARALLEL_PARSE_BYTES", 1)
+    monkeypatch.setattr(lobster_core, "PARSE_WORKERS", 2)
+    try:
+        with lobster_core.open_lobster_file(path) as stream:
+            parsed, _ = lobster_core.parse_lobster_header(stream)
+        parsed.update(source=path, n_points=N_POINTS - 1)
+        # Header and file disagree: no parallel block, the streamed pass is used instead
+        assert lobster_core.parse_block_parallel(parsed, [0, 3]) is None
+        np.testing.assert_allclose(lobster_core.read_numeric_columns(parsed, [0, 3])[1],
+                                   streamed["spin_block"][0, 0, 0])
+    finally:
+        executor = lobster_core._executor
+        if executor is not None:
+            lobster_core.reset_executor(executor)
+
+# --- DOSCAR layout ---
+@pytest.mark.parametrize("spins", [1, 2])
+def test_doscar_layout(tmp_path, spins):
+    energy, blocks = write_doscar(tmp_path / "DOSCAR.lobster", [(27, ["4s", "3d_xy"]), (13, ["3s", "3p_x"])], spins)
+    with lobster_core.open_lobster_file(str(tmp_path / "DOSCAR.lobster")) as stream:
+        dos = lobster_core.parse_doscar(stream)
+    assert dos["spins"] == spins
+    assert dos["shape"] == (spins + 4 * spins, N_POINTS)
+    np.testing.assert_allclose(dos["energy"], energy)
+    assert [site["z"] for site in dos["sites"]] == [27, 13]
+    assert dos["sites"][1]["orbital_columns"]["3p_x"] == [spins + 3 * spins + s for s in range(spins)]
+    matrix = lobster_core.dos_matrix(dos)
+    np.testing.assert_allclose(matrix[:spins].T, np.full((N_POINTS, spins), 10.0) + np.arange(spins))
+    np.testing.assert_allclose(matrix[spins:3 * spins].T, blocks[0])
+    del matrix
+    dos["projections"] = lobster_core.dos_projections(dos, {1: "Co", 2: "Al"})
+    assert set(dos["projections"]) == {"Total", "Co", "Co s", "Co d", "Al", "Al s", "Al p"}
+    # Spin channels of a projection are summed
+    curve, = lobster_core.dos_curves(dos, ["Al p"])
+    np.testing.assert_allclose(curve, blocks[1][:, spins:].sum(axis=1))
+    lobster_core.discard_compound({"cohp": None, "coop": None, "dos": dos})
+    assert not os.path.exists(dos["path"])
+
+def test_parse_compound_shares_energy_axis(tmp_path):
+    write_cohpcar(tmp_path / "COHPCAR.lobster", LABELS)
+    write_doscar(tmp_path / "DOSCAR.lobster", [(27, ["3d_xy"]), (13, ["3s"]), (13, ["3s"])])
+    compound = lobster_core.parse_compound("synthetic", {
+        "cohp": str(tmp_path / "COHPCAR.lobster"),
+        "doscar": str(tmp_path / "DOSCAR.lobster"),
+    })
+    assert compound["unique_pairs"] == [("Al", "Al"), ("Al", "Co")]
+    assert compound["dos"]["energy"] is compound["cohp"]["energy"]
+    assert compound["dos"]["projections"]["Al"] == [2, 3]
+    lobster_core.discard_compound(compound)